@@ -5,22 +5,21 @@ from app.crud.user import create_user, delete_user
 from app.db.session import get_db
 from app.dependencies.auth import create_access_token, get_current_user, authenticate_user
 from app.models.user import User
-from app.schemas.user import UserCreate, UserResponse
+from app.schemas.user import UserCreate, UserResponse, user_adapter
 from app.schemas.auth import LoginRequest, Token
 from datetime import timedelta
-import random
 from app.utils.logger import logger
 from app.config import settings
-from app.utils.utils import create_json_response
+from app.utils.deletion_worker import deletion_worker
+from app.websockets.connection import manager
+from app.websockets.tickets import room_tickets
+from app.utils.conditional import room_versions
+from app.utils.utils import create_json_response, create_model_response
 
 router = APIRouter()
 
 @router.post("/register", response_model=UserResponse)
 async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
-    # Generate a random 4-digit ID for the user
-    random_id = random.randint(1000, 9999)
-    logger.info(f"Generated random 4-digit ID: {random_id} for user {user_data.username}")
-
     # Check if username already exists
     existing_user = db.query(User).filter(User.username == user_data.username).first()
     if existing_user:
@@ -33,9 +32,9 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
         logger.warning(f"Registration failed: Email '{user_data.email}' already exists")
         return create_json_response(False, "Email already exists", status_code=400)
     
-    # Create new user with the random ID
-    new_user = create_user(db, user_data, random_id)  # Pass the random ID to create_user
-    return new_user
+    # Create new user; create_user allocates a time-ordered ID
+    new_user = create_user(db, user_data)
+    return create_model_response(user_adapter, new_user)
 
 @router.post("/login", response_model=Token)
 async def login_for_access_token(form_data: LoginRequest, db: Session = Depends(get_db)):
@@ -63,12 +62,18 @@ async def logout(current_user: User = Depends(get_current_user)):
 
 @router.delete("/delete", response_model=str)
 async def delete_account(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Call the function to delete the user
-    deleted_user = delete_user(db, current_user.id)
+    # Mark the user deleted; their data is purged in the background
+    user_id, username = current_user.id, current_user.username  # Read before the commit expires them
+    job_id = delete_user(db, user_id)
     
-    if deleted_user:
-        logger.info(f"User '{current_user.username}' has been deleted")
-        return create_json_response(True, f"User '{current_user.username}' deleted successfully", data={})
+    if job_id:
+        room_tickets.revoke(user_id=user_id)
+        room_versions.forget_user(user_id)
+        # Sockets on other workers are refused at their next message
+        await manager.close_user(user_id, "Account deleted")
+        deletion_worker.wake()
+        logger.info(f"User '{username}' has been deleted")
+        return create_json_response(True, f"User '{username}' deleted successfully", data={"job_id": job_id})
     else:
-        logger.warning(f"Attempted to delete user '{current_user.username}', but user was not found.")
+        logger.warning(f"Attempted to delete user '{username}', but user was not found.")
         return create_json_response(False, "User not found", status_code=404)
\ No newline at end of file
@@ -1,21 +1,30 @@
 #app/api/chat.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-import random
+from typing import List, Optional
 import asyncio
-from app.schemas.room import ChatRoomCreate, ChatRoomResponse
-from app.schemas.message import MessageCreate, MessageResponse
+from app.schemas.room import ChatRoomCreate, ChatRoomResponse, room_adapter, room_list_adapter
+from app.schemas.message import MessageBatchCreate, MessageCreate, MessageResponse
 from app.schemas.user import UserResponse
 from app.dependencies.auth import get_current_user
-from app.db.session import get_db
+from app.db.session import get_db, SessionLocal
+from app.db.shards import shard_router
 from app.models.user import User
 from app.models.room import ChatRoom
-from app.crud.room import create_chat_room, get_chat_room, get_chat_rooms, add_user_to_room, remove_user_from_room
-from app.crud.message import create_message, get_messages
+from app.crud.room import create_chat_room, get_chat_room, get_chat_rooms, delete_chat_room, add_user_to_room, remove_user_from_room, get_member_room_ids
+from app.crud.deletion import get_deletion_job
+from app.crud.room_summary import get_inbox
+from app.crud.message import create_message, create_messages_batch, get_messages, get_message_rows, iter_room_messages
 from app.websockets.connection import manager
+from app.websockets.read_state import read_state
+from app.websockets.tickets import room_tickets
 from app.utils.logger import logger
-from app.utils.utils import create_json_response
+from app.config import settings
+from app.utils.deletion_worker import deletion_worker
+from app.utils.room_directory import room_directory
+from app.utils.conditional import room_versions
+from app.utils.utils import create_json_response, create_model_response, create_rows_response, encode_ndjson
 import json
 
 router = APIRouter()
@@ -29,7 +38,7 @@ async def get_all_chat_rooms(
     if not rooms:
         raise HTTPException(status_code=404, detail="No chat rooms found.")
     
-    return rooms
+    return create_model_response(room_list_adapter, rooms)
     
 
 @router.post("/rooms", response_model=ChatRoomResponse)
@@ -38,19 +47,78 @@ async def create_room(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    random_id = random.randint(1000, 9999)
-    logger.info(f"Generated random 4-digit ID: {random_id} for room.")
-    new_room = create_chat_room(db, room_data, current_user.id, random_id)
+    new_room = create_chat_room(db, room_data, current_user.id)
     print("new room", new_room.name)
-    return new_room
+    return create_model_response(room_adapter, new_room)
+
+
+@router.get("/directory")
+async def search_room_directory(
+    q: str = "",
+    match: str = "prefix",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    # Served from the in-memory index; the only query is the token's user lookup
+    if match not in ("prefix", "substring"):
+        return create_json_response(False, "match must be 'prefix' or 'substring'", status_code=400)
+    limit = max(1, min(limit, 100))
+    try:
+        rooms, next_cursor = room_directory.search(q, substring=match == "substring", limit=limit, cursor=cursor)
+    except ValueError as e:
+        return create_json_response(False, str(e), status_code=400)
+    # Pass next_cursor back as ?cursor= to fetch the next page
+    return create_json_response(True, "Room directory successfully retrieved.", data={"rooms": rooms, "next_cursor": next_cursor})
+
+
+@router.get("/unread")
+async def get_unread_counts(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    counts = read_state.get_unread_counts(db, current_user.id)
+    rooms_data = [{"room_id": room_id, "unread_count": count} for room_id, count in counts.items()]
+    return create_json_response(True, "Unread counts successfully retrieved.", data={"rooms": rooms_data, "total": sum(counts.values())})
+
+
+@router.get("/inbox")
+async def get_my_inbox(
+    limit: int = 20,
+    before: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    limit = max(1, min(limit, 100))
+    rows = get_inbox(db, current_user.id, limit, before)
+    rooms_data = [
+        {
+            "room_id": summary.room_id,
+            "name": name,
+            "member_count": summary.member_count,
+            "last_activity_id": summary.last_activity_id,
+            "last_message": {
+                "id": summary.last_message_id,
+                "text": summary.last_message_text,
+                "sender_id": summary.last_message_sender_id,
+                "created_at": summary.last_message_at.isoformat() if summary.last_message_at else None
+            } if summary.last_message_id else None
+        }
+        for summary, name in rows
+    ]
+    # Pass next_before back as ?before= to fetch the next page
+    next_before = rows[-1][0].last_activity_id if len(rows) == limit else None
+    return create_json_response(True, "Inbox successfully retrieved.", data={"rooms": rooms_data, "next_before": next_before})
 
 
 @router.get("/rooms/{room_id}", response_model=ChatRoomResponse)
 async def get_room_details(
     room_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    version = room_versions.version(room_id)  # Before the queries, so a concurrent change makes the ETag stale
     room = get_chat_room(db, room_id)
     if not room:
         return create_json_response(False, "Chat room not found", status_code=404)
@@ -60,7 +128,54 @@ async def get_room_details(
         logger.warning(f"Access denied: User {current_user.username} attempted to access room {room.name} they are not a member of.")
         return create_json_response(False, "Access denied: You are not a member of this room", status_code=403)
     
-    return room
+    return room_versions.conditional_response(request, current_user.id, room_id, version, create_model_response(room_adapter, room))
+
+@router.delete("/rooms/{room_id}")
+async def delete_room(
+    room_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    room = get_chat_room(db, room_id)
+    if not room:
+        return create_json_response(False, "Room not found", status_code=404)
+
+    if room.creator_id != current_user.id:
+        logger.warning(f"Access denied: User {current_user.username} attempted to delete room {room.name} they did not create.")
+        return create_json_response(False, "Only the room creator can delete this room", status_code=403)
+
+    # Mark the room deleted; its history is purged in the background
+    room_name = room.name  # Read before the commit expires it
+    job_id = delete_chat_room(db, room_id, requested_by=current_user.id)
+    room_tickets.revoke(room_id=room_id)
+    # Sockets on other workers are refused at their next message
+    await manager.close_room(room_id, "Room deleted")
+    deletion_worker.wake()
+    return create_json_response(True, f"Room {room_name} scheduled for deletion", data={"room_id": room_id, "job_id": job_id})
+
+
+@router.get("/deletions/{job_id}")
+async def get_deletion_progress(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    job = get_deletion_job(db, job_id)
+    if not job or job.requested_by != current_user.id:
+        return create_json_response(False, "Deletion job not found", status_code=404)
+
+    return create_json_response(True, "Deletion progress successfully retrieved.", data={
+        "job_id": job.id,
+        "entity_type": job.entity_type,
+        "entity_id": job.entity_id,
+        "status": job.status,
+        "phase": job.phase,
+        "rows_deleted": job.rows_deleted,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    })
+
 
 @router.post("/rooms/{room_id}/join")
 async def join_room(
@@ -79,6 +194,7 @@ async def join_room(
     
     success = add_user_to_room(db, current_user.id, room_id)
     if success:
+        read_state.invalidate(current_user.id)
         return create_json_response(True, f"Successfully joined room: {room.name}", data={"room_id": room.id, "room_name": room.name})
     
     return create_json_response(False, "Failed to join room", status_code=400)
@@ -104,17 +220,43 @@ async def leave_room(
     
     success = remove_user_from_room(db, current_user.id, room_id)
     if success:
+        read_state.invalidate(current_user.id)
+        room_tickets.revoke(user_id=current_user.id, room_id=room_id)
         return create_json_response(True, f"Successfully left room: {room.name}", data={"room_id": room.id, "room_name": room.name})
     
     return create_json_response(False, "Failed to leave room", status_code=400)
 
 
+@router.post("/rooms/{room_id}/ticket")
+async def issue_room_ticket(
+    room_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    room = get_chat_room(db, room_id)
+    if not room:
+        return create_json_response(False, "Room not found", status_code=404)
+
+    if current_user not in room.users:
+        return create_json_response(False, "Access denied: You are not a member of this room", status_code=403)
+
+    # Pass as ?ticket= when opening the room's WebSocket; valid for one room and a short time
+    ticket = room_tickets.issue(current_user.id, current_user.username, room_id)
+    return create_json_response(True, "Room ticket issued.", data={
+        "ticket": ticket,
+        "room_id": room_id,
+        "expires_in": settings.ROOM_TICKET_TTL_SECONDS
+    })
+
+
 @router.get("/rooms/{room_id}/users")
 async def get_room_users(
     room_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    version = room_versions.version(room_id)  # Before the queries, so a concurrent change makes the ETag stale
     room = get_chat_room(db, room_id)
     if not room:
         return create_json_response(False, "Room not found", status_code=404)
@@ -131,16 +273,20 @@ async def get_room_users(
         {"id": user.id, "username": user.username, "is_online": user.id in active_users} for user in room.users
     ]
     
-    return create_json_response(True, "Room users successfully retrieved.", data={"users": users_data})
+    response = create_json_response(True, "Room users successfully retrieved.", data={"users": users_data})
+    return room_versions.conditional_response(request, current_user.id, room_id, version, response)
 
 
 @router.get("/rooms/{room_id}/messages", response_model=List[MessageResponse])
 async def get_room_messages(
     room_id: int,
+    request: Request,
     limit: int = 100,
+    after: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    version = room_versions.version(room_id)  # Before the queries, so a concurrent change makes the ETag stale
     # Check if room exists
     room = get_chat_room(db, room_id)
     if not room:
@@ -152,8 +298,88 @@ async def get_room_messages(
         return create_json_response(False, "Access denied: You are not a member of this room", status_code=403)
     
     
-    messages = get_messages(db, room_id, limit)
-    return messages
+    # Rows come straight from the DB, so they are serialized without re-validation
+    rows = get_message_rows(db, room_id, limit, after)
+    return room_versions.conditional_response(request, current_user.id, room_id, version, create_rows_response(rows))
+
+
+@router.post("/messages")
+async def post_messages(
+    batch: MessageBatchCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    user_id, username = current_user.id, current_user.username  # Read before the commit expires them
+    # One membership query covers every room in the batch
+    allowed = get_member_room_ids(db, user_id, {item.room_id for item in batch.messages})
+    accepted = [index for index, item in enumerate(batch.messages) if item.room_id in allowed]
+    stored = create_messages_batch(db, user_id, [batch.messages[index] for index in accepted])
+
+    results = [
+        {"index": index, "status": "rejected", "room_id": item.room_id, "error": "Room not found or you are not a member"}
+        for index, item in enumerate(batch.messages)
+    ]
+    new_by_room = {}
+    for index, (message, created) in zip(accepted, stored):
+        results[index] = {"index": index, "status": "created" if created else "duplicate", "room_id": message["room_id"], "message_id": message["id"]}
+        if created:
+            new_by_room.setdefault(message["room_id"], []).append({
+                "id": message["id"],
+                "text": message["text"],
+                "sender_id": message["sender_id"],
+                "sender_username": username,
+                "room_id": message["room_id"],
+                "created_at": message["created_at"].isoformat()
+            })
+
+    # One coalesced frame per room
+    for room_id, messages in new_by_room.items():
+        for message in messages:
+            read_state.message_created(room_id, message["id"], user_id)
+        await manager.broadcast_messages(messages, room_id)
+
+    created_count = sum(len(messages) for messages in new_by_room.values())
+    rejected_count = len(batch.messages) - len(accepted)
+    logger.info(f"User {username} posted {len(batch.messages)} messages: {created_count} created, {rejected_count} rejected")
+    return create_json_response(True, "Messages processed.", data={
+        "results": results,
+        "created": created_count,
+        "duplicates": len(accepted) - created_count,
+        "rejected": rejected_count
+    })
+
+
+@router.get("/rooms/{room_id}/export")
+async def export_room_messages(
+    room_id: int,
+    gzip: bool = False,
+    batch_size: int = 1000,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    room = get_chat_room(db, room_id)
+    if not room:
+        return create_json_response(False, "Room not found", status_code=404)
+
+    if current_user not in room.users:
+        logger.warning(f"Access denied: User {current_user.username} attempted to export room {room.name} they are not a member of.")
+        return create_json_response(False, "Access denied: You are not a member of this room", status_code=403)
+
+    batch_size = max(1, min(batch_size, 10000))
+    logger.info(f"User {current_user.username} exporting room {room.name} (gzip={gzip})")
+
+    # get_db only closes the request session after the stream ends; release its connection now.
+    # The stream opens its own short-lived session per batch.
+    db.close()
+
+    # A .gz download is a gzip file, not a compressed transfer of an .ndjson one: no Content-Encoding,
+    # so clients save the bytes as sent
+    filename = f"room_{room_id}.ndjson.gz" if gzip else f"room_{room_id}.ndjson"
+    return StreamingResponse(
+        encode_ndjson(iter_room_messages(shard_router.session_factory_for_room(room_id), room_id, batch_size), compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 # @app.post("/api/chat/rooms/{room_id}/messages", response_model=MessageResponse)
 # async def send_message(
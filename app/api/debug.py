@@ -0,0 +1,79 @@
+# app/api/debug.py
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from app.config import settings
+from app.db.pool import pool_report
+from app.db.session import engine
+from app.db.shards import PRIMARY, shard_router
+from app.dependencies.auth import get_current_user
+from app.models.user import User
+from app.utils.diagnostics import diagnostics
+from app.utils.query_budget import budget_report, reset_stats
+from app.utils.logger import logger
+from app.utils.utils import create_json_response
+
+router = APIRouter()
+
+
+def check_diagnostics_access(current_user: User, enabled: bool):
+    """Returns an error response unless the feature is on and the user is allowed to read diagnostics."""
+    if not enabled:
+        return create_json_response(False, "Diagnostics are disabled", status_code=404)
+    allowed = {name.strip() for name in settings.DIAGNOSTICS_ALLOWED_USERS.split(",") if name.strip()}
+    if current_user.username not in allowed:
+        logger.warning(f"Access denied: User {current_user.username} attempted to read diagnostics")
+        return create_json_response(False, "Access denied", status_code=403)
+    return None
+
+
+@router.get("/profile")
+async def get_profile(
+    reset: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    # Collapsed stacks, ready for flamegraph.pl / speedscope
+    error = check_diagnostics_access(current_user, settings.DIAGNOSTICS_ENABLED and diagnostics.running)
+    if error:
+        return error
+    return PlainTextResponse(diagnostics.collapsed_stacks(reset=reset))
+
+
+@router.get("/stalls")
+async def get_stalls(current_user: User = Depends(get_current_user)):
+    error = check_diagnostics_access(current_user, settings.DIAGNOSTICS_ENABLED and diagnostics.running)
+    if error:
+        return error
+    return create_json_response(True, "Event loop stalls successfully retrieved.", data={
+        "threshold_ms": settings.DIAGNOSTICS_SLOW_CALLBACK_MS,
+        "started_at": diagnostics.started_at.isoformat() if diagnostics.started_at else None,
+        "stalls": diagnostics.stall_reports()
+    })
+
+
+@router.get("/queries")
+async def get_query_report(
+    reset: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    # SQL statements per endpoint / WebSocket frame, over-budget endpoints first
+    error = check_diagnostics_access(current_user, settings.QUERY_STATS_ENABLED)
+    if error:
+        return error
+    report = budget_report()
+    if reset:
+        reset_stats()
+    return create_json_response(True, "Query report successfully retrieved.", data={
+        "endpoints": report,
+        "over_budget": [row["endpoint"] for row in report if row["over_budget_calls"]]
+    })
+
+
+@router.get("/pool")
+async def get_pool_report(current_user: User = Depends(get_current_user)):
+    # Always collected; a rising "waited"/"timeouts" means sessions are held too long or the pool is too small
+    error = check_diagnostics_access(current_user, True)
+    if error:
+        return error
+    return create_json_response(True, "Connection pool report successfully retrieved.", data={
+        "pools": pool_report({PRIMARY: engine, **shard_router.engines})
+    })
@@ -1,10 +1,15 @@
 
 #app/config.py
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 class Settings(BaseSettings):
     # Database Configuration
     DB_URL: str
+    # Connection pools (primary and each message shard); checkout waits are reported at /api/debug/pool
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
 
     # Security Settings
     SECRET_KEY: str
@@ -16,6 +21,65 @@ class Settings(BaseSettings):
 
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Room tickets: signed, single-room credentials for WebSocket handshakes that skip the database
+    ROOM_TICKET_TTL_SECONDS: int = 60
+
+    # ID generation: every process leases a unique worker slot (0-1023) on the primary at startup;
+    # WORKER_ID pins the slot (startup fails while another process holds it)
+    WORKER_ID: Optional[int] = None
+    WORKER_SLOT_LEASE_SECONDS: float = 60.0
+
+    # Read cursors: how often buffered cursor updates are written, and how long cached unread counts are trusted
+    READ_CURSOR_FLUSH_INTERVAL_SECONDS: float = 1.0
+    UNREAD_CACHE_TTL_SECONDS: int = 30
+
+    # WebSocket fan-out: presence deltas are coalesced per interval and shed for sockets with long queues;
+    # a socket with WS_OUTBOUND_QUEUE_LIMIT frames still queued is closed (1013) instead of growing its queue
+    PRESENCE_FLUSH_INTERVAL_SECONDS: float = 1.0
+    WS_OUTBOUND_QUEUE_LIMIT: int = 1000
+
+    # Graceful shutdown: sockets are closed in waves over the drain period, and clients are told to
+    # reconnect after a random delay within the reconnect window
+    SHUTDOWN_DRAIN_SECONDS: float = 10.0
+    SHUTDOWN_DRAIN_WAVES: int = 10
+    SHUTDOWN_RECONNECT_WINDOW_SECONDS: float = 30.0
+    SHUTDOWN_FLUSH_TIMEOUT_SECONDS: float = 5.0
+
+    # Admission control: new work is refused above these limits (per worker process)
+    ADMISSION_MAX_CONNECTIONS: int = 20000
+    ADMISSION_MAX_ROOM_CONNECTIONS: int = 10000
+    ADMISSION_MAX_INFLIGHT_REQUESTS: int = 500
+    ADMISSION_MAX_LOOP_LAG_MS: float = 250
+    ADMISSION_RETRY_AFTER_SECONDS: int = 5
+
+    # Diagnostics (opt-in): event-loop stall detector and sampling profiler under /api/debug
+    DIAGNOSTICS_ENABLED: bool = False
+    DIAGNOSTICS_SLOW_CALLBACK_MS: float = 100
+    DIAGNOSTICS_SAMPLE_INTERVAL_MS: float = 10
+    DIAGNOSTICS_ALLOWED_USERS: str = ""  # Comma-separated usernames allowed to read diagnostics
+    # Per-request / per-frame SQL statement counting, reported at /api/debug/queries
+    QUERY_STATS_ENABLED: bool = False
+
+    # Background deletion of users/rooms: rows per chunk, pause between chunks, job lease for crash recovery
+    DELETION_BATCH_SIZE: int = 1000
+    DELETION_THROTTLE_SECONDS: float = 0.1
+    DELETION_POLL_INTERVAL_SECONDS: float = 5.0
+    DELETION_LEASE_SECONDS: float = 60.0
+
+    # Message sharding: "name=url,name=url"; empty keeps messages on the primary database.
+    # Placement pins written by the rebalancer are reloaded at this interval.
+    MESSAGE_SHARDS: str = ""
+    SHARD_PLACEMENT_REFRESH_SECONDS: float = 5.0
+
+    # Room directory: in-memory name index; recent creations/deletions are polled, full rebuilds fix member counts
+    ROOM_DIRECTORY_REFRESH_SECONDS: float = 5.0
+    ROOM_DIRECTORY_REBUILD_SECONDS: float = 600.0
+
+    # Conditional GETs: remembered ETags for room resources, answered with 304 without the database
+    ETAG_MAX_AGE_SECONDS: float = 30.0
+    ETAG_CACHE_ENTRIES: int = 100000
+    ROOM_VERSION_REFRESH_SECONDS: float = 1.0
+
     # FastAPI Application Settings
     APP_NAME: str = "Chat Application"
     APP_VERSION: str = "1.0.0"
@@ -0,0 +1,158 @@
+# app/crud/deletion.py
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.orm import Session
+from app.models.deletion_job import DeletionJob
+from app.models.message import Message
+from app.models.room import ChatRoom
+from app.models.room_summary import RoomSummary
+from app.models.room_users import room_users
+from app.models.shard_placement import ShardPlacement
+from app.models.user import User
+from app.crud.room_summary import adjust_member_count, refresh_room_previews
+from app.db.shards import shard_router
+from app.utils.ids import next_id
+from app.utils.logger import logger
+
+# Phases run in order; each one repeats in bounded chunks until it finds nothing left
+PHASES = {
+    "room": ["messages", "memberships", "summary", "entity"],
+    "user": ["messages", "previews", "memberships", "created_rooms", "entity"],
+}
+
+# Create a job for an entity that has just been marked deleted (the caller commits)
+def create_deletion_job(db: Session, entity_type: str, entity_id: int, requested_by: int = None):
+    job = DeletionJob(
+        id=next_id(),  # Assigned up front so callers can read it without a flush or a reload
+        entity_type=entity_type,
+        entity_id=entity_id,
+        requested_by=requested_by,
+        status="pending",
+        phase=PHASES[entity_type][0]
+    )
+    db.add(job)
+    return job
+
+def get_deletion_job(db: Session, job_id: int):
+    return db.query(DeletionJob).filter(DeletionJob.id == job_id).first()
+
+# Jobs that are pending, or running under a lease that has expired (its worker crashed)
+def get_resumable_job_ids(db: Session, lease_seconds: float):
+    stale = datetime.utcnow() - timedelta(seconds=lease_seconds)
+    return db.execute(
+        select(DeletionJob.id)
+        .where(or_(
+            DeletionJob.status == "pending",
+            and_(DeletionJob.status == "running", DeletionJob.updated_at < stale)
+        ))
+        .order_by(DeletionJob.id)
+    ).scalars().all()
+
+# Atomically take ownership of a job so two workers never process it concurrently
+def claim_deletion_job(db: Session, job_id: int, lease_seconds: float) -> bool:
+    now = datetime.utcnow()
+    result = db.execute(
+        update(DeletionJob)
+        .where(
+            DeletionJob.id == job_id,
+            or_(
+                DeletionJob.status == "pending",
+                and_(DeletionJob.status == "running", DeletionJob.updated_at < now - timedelta(seconds=lease_seconds))
+            )
+        )
+        .values(status="running", updated_at=now)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+# Messages may live on a shard, where the chunk is committed right away; the job's progress
+# follows on the primary. Re-running a chunk after a crash in between finds nothing to redo.
+def _delete_message_chunk(db: Session, message_db: Session, condition, batch_size: int) -> int:
+    ids = message_db.execute(select(Message.id).where(condition).limit(batch_size)).scalars().all()
+    if ids:
+        message_db.execute(delete(Message).where(Message.id.in_(ids)))
+        if message_db is not db:
+            message_db.commit()
+    return len(ids)
+
+def _delete_room_chunk(db: Session, room_id: int, phase: str, batch_size: int) -> int:
+    if phase == "messages":
+        with shard_router.message_session(db, room_id) as message_db:
+            return _delete_message_chunk(db, message_db, Message.room_id == room_id, batch_size)
+    if phase == "memberships":
+        user_ids = db.execute(
+            select(room_users.c.user_id).where(room_users.c.room_id == room_id).limit(batch_size)
+        ).scalars().all()
+        if user_ids:
+            db.execute(delete(room_users).where(room_users.c.room_id == room_id, room_users.c.user_id.in_(user_ids)))
+        return len(user_ids)
+    if phase == "summary":
+        return db.execute(delete(RoomSummary).where(RoomSummary.room_id == room_id)).rowcount
+    if phase == "entity":
+        db.execute(delete(ShardPlacement).where(ShardPlacement.room_id == room_id))
+        return db.execute(delete(ChatRoom).where(ChatRoom.id == room_id)).rowcount
+    raise ValueError(f"Unknown room deletion phase: {phase}")
+
+def _delete_user_chunk(db: Session, user_id: int, phase: str, batch_size: int) -> int:
+    if phase == "messages":
+        # A user's messages are spread over every shard; the chunk only comes up short once all are drained
+        deleted = 0
+        for location in shard_router.locations:
+            if deleted >= batch_size:
+                break
+            with shard_router.location_session(db, location) as message_db:
+                deleted += _delete_message_chunk(db, message_db, Message.sender_id == user_id, batch_size - deleted)
+        return deleted
+    if phase == "previews":
+        # Inbox rows still quoting the user's (now deleted) last message
+        room_ids = db.execute(
+            select(RoomSummary.room_id).where(RoomSummary.last_message_sender_id == user_id).limit(batch_size)
+        ).scalars().all()
+        refresh_room_previews(db, room_ids)
+        return len(room_ids)
+    if phase == "memberships":
+        room_ids = db.execute(
+            select(room_users.c.room_id).where(room_users.c.user_id == user_id).limit(batch_size)
+        ).scalars().all()
+        if room_ids:
+            db.execute(delete(room_users).where(room_users.c.user_id == user_id, room_users.c.room_id.in_(room_ids)))
+            for room_id in room_ids:
+                adjust_member_count(db, room_id, -1)
+        return len(room_ids)
+    if phase == "created_rooms":
+        # Rooms outlive their creator; only the reference is cleared
+        room_ids = db.execute(select(ChatRoom.id).where(ChatRoom.creator_id == user_id).limit(batch_size)).scalars().all()
+        if room_ids:
+            db.execute(update(ChatRoom).where(ChatRoom.id.in_(room_ids)).values(creator_id=None))
+        return len(room_ids)
+    if phase == "entity":
+        return db.execute(delete(User).where(User.id == user_id)).rowcount
+    raise ValueError(f"Unknown user deletion phase: {phase}")
+
+# Run one bounded chunk of a job and record progress in the same transaction.
+# Returns True once the job has finished.
+def run_deletion_chunk(db: Session, job: DeletionJob, batch_size: int) -> bool:
+    if job.entity_type == "room":
+        deleted = _delete_room_chunk(db, job.entity_id, job.phase, batch_size)
+    else:
+        deleted = _delete_user_chunk(db, job.entity_id, job.phase, batch_size)
+
+    job.rows_deleted += deleted
+    job.updated_at = datetime.utcnow()
+    job.error = None
+    if deleted < batch_size:
+        # Phase exhausted: move on to the next one
+        phases = PHASES[job.entity_type]
+        next_index = phases.index(job.phase) + 1
+        if next_index < len(phases):
+            job.phase = phases[next_index]
+        else:
+            job.status = "done"
+            job.finished_at = job.updated_at
+            logger.info(f"Deletion job {job.id} finished: {job.entity_type} {job.entity_id}, {job.rows_deleted} rows removed")
+    db.commit()
+    return job.status == "done"
+
+def record_deletion_error(db: Session, job_id: int, error: str):
+    db.execute(update(DeletionJob).where(DeletionJob.id == job_id).values(error=error[:500]))
+    db.commit()
@@ -1,33 +1,178 @@
 # app/crud/message.py
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from app.models.message import Message
+from app.models.room import ChatRoom
+from app.models.user import User
 from app.schemas.message import MessageCreate, MessageResponse
 from app.utils.logger import logger
+from app.crud.room_summary import touch_room_summary, touch_room_summaries
+from app.db.shards import shard_router
+from app.utils.ids import next_id
+from app.utils.conditional import room_versions
+
+# Check that neither the room nor the sender has been deleted, locking both rows until the
+# caller commits. Deletion marks them with an UPDATE, which then waits for a message written
+# under the lock, so the deletion job's "messages" phase cannot run before that message exists
+# (on MySQL; SQLite serializes writers anyway). Call in the same session as save_message.
+def lock_room_and_sender(db: Session, room_id: int, sender_id: int) -> bool:
+    return db.execute(
+        select(ChatRoom.id)
+        .join(User, User.id == sender_id)
+        .where(ChatRoom.id == room_id, ChatRoom.deleted_at.is_(None), User.deleted_at.is_(None))
+        .with_for_update()
+    ).first() is not None
+
+# Persist a new message on its room's shard and advance the room summary on the primary.
+# Unsharded, both writes share the caller's transaction.
+def save_message(db: Session, new_message: Message):
+    with shard_router.message_session(db, new_message.room_id) as message_db:
+        message_db.add(new_message)
+        message_db.flush()
+        # Detached with its flushed values: a commit would expire them and cost a reload
+        message_db.expunge(new_message)
+        if message_db is not db:
+            # Committed on the shard first so the summary never points at a missing message
+            message_db.commit()
+        touch_room_summary(db, new_message)
+        db.commit()
+    room_versions.bump(new_message.room_id)
+    return new_message
 
 # Create a new message in a chat room
 def create_message(db: Session, message_data: MessageCreate, room_id: int, sender_id: int):
-    new_message = Message(text=message_data.text, room_id=room_id, sender_id=sender_id)
-    db.add(new_message)
-    db.commit()
-    db.refresh(new_message)
+    new_message = save_message(db, Message(text=message_data.text, room_id=room_id, sender_id=sender_id))
     logger.info(f"Message created in room ID {room_id} by user ID {sender_id}")
     logger.debug(f"Message content: {new_message.text[:50]}...")
     return new_message
 
-# Get all messages in a chat room
+# Store a batch of messages from one sender with one multi-row INSERT per shard. Items whose
+# idempotency key was already stored for that room and sender (earlier or within the batch)
+# are not inserted again. Returns one (message dict, created) pair per item, in item order.
+def create_messages_batch(db: Session, sender_id: int, items):
+    results = [None] * len(items)
+    ids = [next_id() for _ in items]  # Allocated up front so IDs follow item order across shards
+    by_location = defaultdict(list)
+    for index, item in enumerate(items):
+        by_location[shard_router.shard_for_room(item.room_id)].append(index)
+
+    newest = {}  # room_id -> newest created message, for the summaries
+    for location, indexes in by_location.items():
+        with shard_router.location_session(db, location) as message_db:
+            try:
+                created = _insert_message_batch(message_db, sender_id, items, ids, indexes, results)
+            except IntegrityError:
+                # A concurrent retry stored some of the same keys first: re-read them and insert the rest
+                message_db.rollback()
+                created = _insert_message_batch(message_db, sender_id, items, ids, indexes, results)
+            if message_db is not db:
+                message_db.commit()
+        for row in created:
+            newest[row["room_id"]] = row
+
+    touch_room_summaries(db, [Message(**row) for row in newest.values()])
+    db.commit()
+    room_versions.bump_many(newest)
+    logger.info(f"Stored batch of {len(items)} messages from user ID {sender_id} ({sum(created for _, created in results)} new)")
+    return results
+
+def _insert_message_batch(message_db: Session, sender_id: int, items, ids, indexes, results):
+    keyed = [items[index] for index in indexes if items[index].idempotency_key]
+    stored = {}
+    if keyed:
+        rows = message_db.execute(
+            select(Message.id, Message.text, Message.sender_id, Message.room_id, Message.created_at, Message.idempotency_key)
+            .where(
+                Message.sender_id == sender_id,
+                Message.room_id.in_({item.room_id for item in keyed}),
+                Message.idempotency_key.in_({item.idempotency_key for item in keyed})
+            )
+        ).all()
+        stored = {(row.room_id, row.idempotency_key): row._asdict() for row in rows}
+
+    now = datetime.utcnow()
+    new_rows = []
+    for index in indexes:
+        item = items[index]
+        key = (item.room_id, item.idempotency_key)
+        if item.idempotency_key and key in stored:
+            results[index] = (stored[key], False)
+            continue
+        row = {
+            "id": ids[index],
+            "text": item.text,
+            "sender_id": sender_id,
+            "room_id": item.room_id,
+            "created_at": now,
+            "idempotency_key": item.idempotency_key
+        }
+        new_rows.append(row)
+        results[index] = (row, True)
+        if item.idempotency_key:
+            stored[key] = row
+    if new_rows:
+        message_db.execute(insert(Message.__table__), new_rows)
+    return new_rows
+
+# Get the latest messages in a chat room (IDs are time-ordered, so the primary key orders history)
 def get_messages(db: Session, room_id: int, limit: int = 100):
-    messages = db.query(Message).filter(Message.room_id == room_id).order_by(Message.created_at.desc()).limit(limit).all()
+    with shard_router.message_session(db, room_id) as message_db:
+        messages = message_db.query(Message).filter(Message.room_id == room_id).order_by(Message.id.desc()).limit(limit).all()
     messages.reverse()  # Return in chronological order
     logger.debug(f"Fetched {len(messages)} messages from room ID {room_id}")
     return messages
 
-# Delete a message by ID
+# Latest messages as plain column rows, for serializing straight to JSON without ORM objects.
+# With `after`, the oldest messages newer than that ID instead (catching up after a reconnect).
+def get_message_rows(db: Session, room_id: int, limit: int = 100, after: int = None):
+    statement = select(Message.id, Message.text, Message.sender_id, Message.room_id, Message.created_at).where(Message.room_id == room_id)
+    if after is not None:
+        statement = statement.where(Message.id > after).order_by(Message.id)
+    else:
+        statement = statement.order_by(Message.id.desc())
+    with shard_router.message_session(db, room_id) as message_db:
+        rows = message_db.execute(statement.limit(limit)).all()
+    if after is None:
+        rows.reverse()  # Return in chronological order
+    logger.debug(f"Fetched {len(rows)} message rows from room ID {room_id}")
+    return rows
+
+# Iterate over a room's full history in bounded batches (keyset pagination on id).
+# Each batch checks a connection out of the pool only for the duration of one
+# LIMIT query, so a slow consumer never pins a connection and memory stays O(batch_size).
+def iter_room_messages(session_factory, room_id: int, batch_size: int = 1000):
+    last_id = 0
+    while True:
+        db = session_factory()
+        try:
+            rows = db.execute(
+                select(Message.id, Message.text, Message.sender_id, Message.room_id, Message.created_at)
+                .where(Message.room_id == room_id, Message.id > last_id)
+                .order_by(Message.id)
+                .limit(batch_size)
+            ).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1].id
+
+# Delete a message by ID (looked up on every shard, since the room is not known)
 def delete_message(db: Session, message_id: int):
-    message = db.query(Message).filter(Message.id == message_id).first()
-    if message:
-        db.delete(message)
-        db.commit()
-        logger.info(f"Deleted message ID {message.id} from room ID {message.room_id}")
-        return message
+    for location in shard_router.locations:
+        with shard_router.location_session(db, location) as message_db:
+            message = message_db.query(Message).filter(Message.id == message_id).first()
+            if message:
+                message_db.delete(message)
+                message_db.commit()
+                room_versions.bump(message.room_id)
+                logger.info(f"Deleted message ID {message.id} from room ID {message.room_id}")
+                return message
     logger.warning(f"Message with ID {message_id} not found for deletion")
     return None
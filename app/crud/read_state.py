@@ -0,0 +1,77 @@
+# app/crud/read_state.py
+from collections import defaultdict
+from typing import Dict, List, Tuple
+from sqlalchemy import and_, bindparam, func, or_, select, update
+from sqlalchemy.orm import Session
+from app.models.message import Message
+from app.models.room_users import room_users
+from app.db.shards import shard_router
+from app.utils.logger import logger
+
+# Advance read cursors for many (user_id, room_id, message_id) triples in one executemany.
+# Cursors only move forward, and rows for non-members simply match nothing.
+def update_read_cursors(db: Session, cursors: List[Tuple[int, int, int]]):
+    if not cursors:
+        return
+    statement = (
+        update(room_users)
+        .where(
+            room_users.c.user_id == bindparam("b_user_id"),
+            room_users.c.room_id == bindparam("b_room_id"),
+            or_(
+                room_users.c.last_read_message_id.is_(None),
+                room_users.c.last_read_message_id < bindparam("b_message_id")
+            )
+        )
+        .values(last_read_message_id=bindparam("b_message_id"))
+    )
+    db.execute(statement, [
+        {"b_user_id": user_id, "b_room_id": room_id, "b_message_id": message_id}
+        for user_id, room_id, message_id in cursors
+    ])
+    db.commit()
+    logger.debug(f"Flushed {len(cursors)} read cursors")
+
+# Unread counts for every room the user belongs to, in a single aggregate query.
+# Messages the user sent themselves never count as unread.
+def get_unread_counts(db: Session, user_id: int) -> Dict[int, int]:
+    if shard_router.sharded:
+        return _get_sharded_unread_counts(db, user_id)
+    statement = (
+        select(room_users.c.room_id, func.count(Message.id))
+        .select_from(room_users)
+        .outerjoin(Message, and_(
+            Message.room_id == room_users.c.room_id,
+            Message.id > func.coalesce(room_users.c.last_read_message_id, 0),
+            Message.sender_id != room_users.c.user_id
+        ))
+        .where(room_users.c.user_id == user_id)
+        .group_by(room_users.c.room_id)
+    )
+    counts = {room_id: count for room_id, count in db.execute(statement)}
+    logger.debug(f"Computed unread counts for user ID {user_id} across {len(counts)} rooms")
+    return counts
+
+# Sharded variant: cursors come from the primary, then one grouped count per shard
+# covering all of the user's rooms that live there.
+def _get_sharded_unread_counts(db: Session, user_id: int) -> Dict[int, int]:
+    memberships = db.execute(
+        select(room_users.c.room_id, room_users.c.last_read_message_id).where(room_users.c.user_id == user_id)
+    ).all()
+    counts = {room_id: 0 for room_id, _ in memberships}
+    by_location = defaultdict(list)
+    for room_id, cursor in memberships:
+        by_location[shard_router.shard_for_room(room_id)].append((room_id, cursor or 0))
+    for location, rooms in by_location.items():
+        statement = (
+            select(Message.room_id, func.count(Message.id))
+            .where(
+                or_(*[and_(Message.room_id == room_id, Message.id > cursor) for room_id, cursor in rooms]),
+                Message.sender_id != user_id
+            )
+            .group_by(Message.room_id)
+        )
+        with shard_router.location_session(db, location) as message_db:
+            counts.update({room_id: count for room_id, count in message_db.execute(statement)})
+    logger.debug(f"Computed unread counts for user ID {user_id} across {len(counts)} rooms on {len(by_location)} shards")
+    return counts
@@ -1,13 +1,22 @@
 # app/crud/room.py
-from sqlalchemy.orm import Session
+from typing import Iterable, Set
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session, selectinload
 from app.models.room import ChatRoom
 from app.schemas.room import ChatRoomCreate, ChatRoomResponse
 from app.utils.logger import logger
 from app.models.user import User
+from app.models.room_users import room_users
+from app.utils.ids import next_id
+from app.crud.room_summary import create_room_summary, adjust_member_count
+from app.crud.deletion import create_deletion_job
+from app.utils.room_directory import room_directory
+from app.utils.conditional import room_versions
+from datetime import datetime
 
 # Create a new chat room
-def create_chat_room(db: Session, room_data: ChatRoomCreate, creator_id: int, random_id: int):
-    new_room = ChatRoom(id= random_id, name=room_data.name, creator_id=creator_id)
+def create_chat_room(db: Session, room_data: ChatRoomCreate, creator_id: int, room_id: int = None):
+    new_room = ChatRoom(id=room_id or next_id(), name=room_data.name, creator_id=creator_id)
     db.add(new_room)
     db.commit()
     db.refresh(new_room)
@@ -15,14 +24,16 @@ def create_chat_room(db: Session, room_data: ChatRoomCreate, creator_id: int, ra
     # Add creator to the room
     creator = db.query(User).filter(User.id == creator_id).first()
     new_room.users.append(creator)
+    create_room_summary(db, new_room.id, member_count=1)
     db.commit()
+    room_directory.room_created(new_room.id, new_room.name, member_count=1)
     
     logger.info(f"Chat room created: {new_room.name} (ID: {new_room.id})")
     return new_room
 
 # Get chat room by ID
 def get_chat_room(db: Session, room_id: int):
-    room = db.query(ChatRoom).filter(ChatRoom.id == room_id).first()
+    room = db.query(ChatRoom).filter(ChatRoom.id == room_id, ChatRoom.deleted_at.is_(None)).first()
     if room:
         logger.info(f"Fetched chat room: {room.name} (ID: {room.id})")  # Log room fetch
     else:
@@ -31,25 +42,39 @@ def get_chat_room(db: Session, room_id: int):
 
 # Get all chat rooms
 def get_chat_rooms(db: Session):
-    rooms = db.query(ChatRoom).all()
+    rooms = db.query(ChatRoom).filter(ChatRoom.deleted_at.is_(None)).options(selectinload(ChatRoom.users)).all()  # One extra query for all members
     logger.info(f"Fetched {len(rooms)} chat rooms")  # Log the number of rooms fetched
     return rooms
 
-# Delete a chat room by ID
-def delete_chat_room(db: Session, room_id: int):
-    room = db.query(ChatRoom).filter(ChatRoom.id == room_id).first()
+# IDs among `room_ids` of live rooms the user belongs to, checked in one query
+def get_member_room_ids(db: Session, user_id: int, room_ids: Iterable[int]) -> Set[int]:
+    return set(db.execute(
+        select(room_users.c.room_id)
+        .join(ChatRoom, and_(ChatRoom.id == room_users.c.room_id, ChatRoom.deleted_at.is_(None)))
+        .where(room_users.c.user_id == user_id, room_users.c.room_id.in_(list(room_ids)))
+    ).scalars())
+
+# Delete a chat room by ID: the room is marked deleted at once; messages, memberships and the
+# row itself are removed in chunks by the deletion worker.
+# Returns the deletion job's ID (read before the commit expires the objects)
+def delete_chat_room(db: Session, room_id: int, requested_by: int = None):
+    room = db.query(ChatRoom).filter(ChatRoom.id == room_id, ChatRoom.deleted_at.is_(None)).first()
     if room:
-        db.delete(room)
+        room.deleted_at = datetime.utcnow()
+        room_name = room.name
+        job_id = create_deletion_job(db, "room", room_id, requested_by=requested_by).id
         db.commit()
-        logger.info(f"Deleted chat room: {room.name} (ID: {room.id})")  # Log room deletion
-        return room
+        room_directory.room_deleted(room_id)
+        room_versions.bump(room_id)
+        logger.info(f"Scheduled deletion of chat room: {room_name} (ID: {room_id}, job {job_id})")  # Log room deletion
+        return job_id
     logger.warning(f"Chat room with ID {room_id} not found for deletion")  # Log warning if room not found
     return None
 
 
 def add_user_to_room(db: Session, user_id: int, room_id: int):
     user = db.query(User).filter(User.id == user_id).first()
-    room = db.query(ChatRoom).filter(ChatRoom.id == room_id).first()
+    room = db.query(ChatRoom).filter(ChatRoom.id == room_id, ChatRoom.deleted_at.is_(None)).first()
     
     if not user or not room:
         logger.warning(f"Failed to add user to room: User ID {user_id} or Room ID {room_id} not found")
@@ -57,7 +82,10 @@ def add_user_to_room(db: Session, user_id: int, room_id: int):
     
     if user not in room.users:
         room.users.append(user)
+        adjust_member_count(db, room.id, 1)
         db.commit()
+        room_directory.members_changed(room.id, 1)
+        room_versions.bump(room.id)
         logger.info(f"Added user {user.username} to room {room.name}")
     else:
         logger.debug(f"User {user.username} already in room {room.name}")
@@ -66,7 +94,7 @@ def add_user_to_room(db: Session, user_id: int, room_id: int):
 
 def remove_user_from_room(db: Session, user_id: int, room_id: int):
     user = db.query(User).filter(User.id == user_id).first()
-    room = db.query(ChatRoom).filter(ChatRoom.id == room_id).first()
+    room = db.query(ChatRoom).filter(ChatRoom.id == room_id, ChatRoom.deleted_at.is_(None)).first()
     
     if not user or not room:
         logger.warning(f"Failed to remove user from room: User ID {user_id} or Room ID {room_id} not found")
@@ -74,7 +102,10 @@ def remove_user_from_room(db: Session, user_id: int, room_id: int):
     
     if user in room.users:
         room.users.remove(user)
+        adjust_member_count(db, room.id, -1)
         db.commit()
+        room_directory.members_changed(room.id, -1)
+        room_versions.bump(room.id)
         logger.info(f"Removed user {user.username} from room {room.name}")
         return True
     
@@ -0,0 +1,168 @@
+# app/crud/room_summary.py
+from collections import defaultdict
+from sqlalchemy import and_, bindparam, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+from app.models.message import Message
+from app.models.room import ChatRoom
+from app.models.room_summary import RoomSummary
+from app.models.room_users import room_users
+from app.db.shards import shard_router
+from app.utils.logger import logger
+
+PREVIEW_LENGTH = 200
+
+# The helpers below only stage changes; the caller commits them with its own write.
+
+def create_room_summary(db: Session, room_id: int, member_count: int = 1):
+    db.add(RoomSummary(room_id=room_id, member_count=member_count, last_activity_id=room_id))
+
+def touch_room_summary(db: Session, message: Message):
+    # Guarded on last_message_id so out-of-order commits never move the preview backwards
+    db.execute(
+        update(RoomSummary)
+        .where(
+            RoomSummary.room_id == message.room_id,
+            or_(RoomSummary.last_message_id.is_(None), RoomSummary.last_message_id < message.id)
+        )
+        .values(
+            last_activity_id=message.id,
+            last_message_id=message.id,
+            last_message_text=(message.text or "")[:PREVIEW_LENGTH],
+            last_message_sender_id=message.sender_id,
+            last_message_at=message.created_at
+        )
+    )
+
+# touch_room_summary for many rooms in one executemany; pass each room's newest message
+def touch_room_summaries(db: Session, messages):
+    if not messages:
+        return
+    summaries = RoomSummary.__table__
+    db.execute(
+        update(summaries)
+        .where(
+            summaries.c.room_id == bindparam("b_room_id"),
+            or_(summaries.c.last_message_id.is_(None), summaries.c.last_message_id < bindparam("b_id"))
+        )
+        .values(
+            last_activity_id=bindparam("b_id"),
+            last_message_id=bindparam("b_id"),
+            last_message_text=bindparam("b_text"),
+            last_message_sender_id=bindparam("b_sender_id"),
+            last_message_at=bindparam("b_created_at")
+        ),
+        [
+            {
+                "b_room_id": message.room_id,
+                "b_id": message.id,
+                "b_text": (message.text or "")[:PREVIEW_LENGTH],
+                "b_sender_id": message.sender_id,
+                "b_created_at": message.created_at
+            }
+            for message in messages
+        ]
+    )
+
+def adjust_member_count(db: Session, room_id: int, delta: int):
+    db.execute(
+        update(RoomSummary)
+        .where(RoomSummary.room_id == room_id)
+        .values(member_count=RoomSummary.member_count + delta)
+    )
+
+def delete_room_summary(db: Session, room_id: int):
+    db.query(RoomSummary).filter(RoomSummary.room_id == room_id).delete(synchronize_session=False)
+
+BACKFILL_BATCH_SIZE = 500  # Rooms per latest-message query
+
+# Newest message of each room that has any, one query per message location
+def _latest_messages(db: Session, room_ids):
+    by_location = defaultdict(list)
+    for room_id in room_ids:
+        by_location[shard_router.shard_for_room(room_id)].append(room_id)
+    messages = []
+    for location, location_room_ids in by_location.items():
+        latest_ids = (
+            select(func.max(Message.id))
+            .where(Message.room_id.in_(location_room_ids))
+            .group_by(Message.room_id)
+        )
+        with shard_router.location_session(db, location) as message_db:
+            messages.extend(message_db.execute(select(Message).where(Message.id.in_(latest_ids))).scalars().all())
+    return messages
+
+# Point previews back at each room's newest remaining message, or clear them when the room has
+# none left (after messages were deleted). last_activity_id is kept, so inbox order does not move.
+def refresh_room_previews(db: Session, room_ids):
+    if not room_ids:
+        return
+    latest = {message.room_id: message for message in _latest_messages(db, room_ids)}
+    summaries = RoomSummary.__table__
+    db.execute(
+        update(summaries)
+        .where(summaries.c.room_id == bindparam("b_room_id"))
+        .values(
+            last_message_id=bindparam("b_id"),
+            last_message_text=bindparam("b_text"),
+            last_message_sender_id=bindparam("b_sender_id"),
+            last_message_at=bindparam("b_created_at")
+        ),
+        [
+            {
+                "b_room_id": room_id,
+                "b_id": message.id if message else None,
+                "b_text": (message.text or "")[:PREVIEW_LENGTH] if message else None,
+                "b_sender_id": message.sender_id if message else None,
+                "b_created_at": message.created_at if message else None
+            }
+            for room_id, message in ((room_id, latest.get(room_id)) for room_id in room_ids)
+        ]
+    )
+
+# Create summaries for rooms that predate the table or were bulk-loaded without one. The rows
+# are inserted in one INSERT ... SELECT (member counts from a grouped room_users count), then
+# previews are filled in batches of rooms, one query per message location and one executemany.
+def backfill_room_summaries(db: Session) -> int:
+    missing = db.execute(
+        select(ChatRoom.id)
+        .outerjoin(RoomSummary, RoomSummary.room_id == ChatRoom.id)
+        .where(RoomSummary.room_id.is_(None))
+    ).scalars().all()
+    if not missing:
+        return 0
+
+    member_counts = (
+        select(room_users.c.room_id, func.count().label("member_count"))
+        .group_by(room_users.c.room_id)
+        .subquery()
+    )
+    db.execute(
+        insert(RoomSummary).from_select(
+            ["room_id", "member_count", "last_activity_id"],
+            select(ChatRoom.id, func.coalesce(member_counts.c.member_count, 0), ChatRoom.id)
+            .outerjoin(member_counts, member_counts.c.room_id == ChatRoom.id)
+            .outerjoin(RoomSummary, RoomSummary.room_id == ChatRoom.id)
+            .where(RoomSummary.room_id.is_(None))
+        )
+    )
+    for start in range(0, len(missing), BACKFILL_BATCH_SIZE):
+        touch_room_summaries(db, _latest_messages(db, missing[start:start + BACKFILL_BATCH_SIZE]))
+    db.commit()
+    logger.info(f"Backfilled {len(missing)} room summaries")
+    return len(missing)
+
+# One page of the user's rooms, newest activity first. Keyset pagination on last_activity_id
+# keeps each page O(limit) no matter how many rooms or messages exist.
+def get_inbox(db: Session, user_id: int, limit: int = 20, before: int = None):
+    statement = (
+        select(RoomSummary, ChatRoom.name)
+        .join(room_users, and_(room_users.c.room_id == RoomSummary.room_id, room_users.c.user_id == user_id))
+        .join(ChatRoom, and_(ChatRoom.id == RoomSummary.room_id, ChatRoom.deleted_at.is_(None)))
+        .order_by(RoomSummary.last_activity_id.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        statement = statement.where(RoomSummary.last_activity_id < before)
+    rows = db.execute(statement).all()
+    logger.debug(f"Fetched inbox page of {len(rows)} rooms for user ID {user_id}")
+    return rows
@@ -4,14 +4,17 @@ from app.models.user import User
 from app.schemas.user import UserCreate, UserResponse
 from app.utils.logger import logger
 from app.dependencies.auth import get_password_hash
+from app.utils.ids import next_id
+from app.crud.deletion import create_deletion_job
+from datetime import datetime
 
-def create_user(db: Session, user_data: UserCreate, random_id: int):
+def create_user(db: Session, user_data: UserCreate, user_id: int = None):
     # Hash the password
     hashed_password = get_password_hash(user_data.password)
     
-    # Create the new user with the random ID
+    # Create the new user; the ID is allocated by app.utils.ids unless one is given
     db_user = User(
-        id=random_id,  # Use the generated random ID here
+        id=user_id or next_id(),
         username=user_data.username,
         email=user_data.email,
         password=hashed_password
@@ -26,7 +29,7 @@ def create_user(db: Session, user_data: UserCreate, random_id: int):
 
 # Get user by ID
 def get_user(db: Session, user_id: int):
-    db_user = db.query(User).filter(User.id == user_id).first()
+    db_user = db.query(User).filter(User.id == user_id, User.deleted_at.is_(None)).first()
     if db_user:
         logger.info(f"Fetched user: {db_user.username} (ID: {db_user.id})")  # Log user fetch
     else:
@@ -35,18 +38,22 @@ def get_user(db: Session, user_id: int):
 
 # Get all users
 def get_all_users(db: Session):
-    db_users = db.query(User).all()
+    db_users = db.query(User).filter(User.deleted_at.is_(None)).all()
     logger.info(f"Fetched {len(db_users)} users")  # Log the number of users fetched
     return db_users
 
-# Delete user by ID
+# Delete user by ID: the user is marked deleted at once; messages, memberships and the row
+# itself are removed in chunks by the deletion worker.
+# Returns the deletion job's ID (read before the commit expires the objects)
 def delete_user(db: Session, user_id: int):
-    db_user = db.query(User).filter(User.id == user_id).first()
+    db_user = db.query(User).filter(User.id == user_id, User.deleted_at.is_(None)).first()
     if db_user:
-        db.delete(db_user)
+        db_user.deleted_at = datetime.utcnow()
+        username = db_user.username
+        job_id = create_deletion_job(db, "user", user_id, requested_by=user_id).id
         db.commit()
-        logger.info(f"Deleted user: {db_user.username} (ID: {db_user.id})")  # Log user deletion
-        return db_user
+        logger.info(f"Scheduled deletion of user: {username} (ID: {user_id}, job {job_id})")  # Log user deletion
+        return job_id
     logger.warning(f"User with ID {user_id} not found for deletion")  # Log warning if user not found
     return None
 
@@ -0,0 +1,63 @@
+# app/crud/worker_slot.py
+from datetime import datetime, timedelta
+from typing import Optional
+import random
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.worker_slot import WorkerSlot
+from app.utils.ids import MAX_WORKER_ID
+from app.utils.logger import logger
+
+
+def claim_worker_slot(db: Session, owner: str, lease_seconds: float, slot: Optional[int] = None) -> Optional[int]:
+    """Lease a free or expired slot (or exactly `slot`) for `owner`; None if none is available.
+
+    Never-used slots are tried first, in random order so processes starting together rarely
+    race for the same row; the insert or the conditional update decides a race.
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=lease_seconds)
+    leases = dict(db.execute(select(WorkerSlot.slot, WorkerSlot.lease_expires_at)).all())
+    if slot is not None:
+        candidates = [slot]
+    else:
+        unused = [candidate for candidate in range(MAX_WORKER_ID + 1) if candidate not in leases]
+        expired = [candidate for candidate, lease_expires_at in leases.items() if lease_expires_at < now]
+        random.shuffle(unused)
+        random.shuffle(expired)
+        candidates = unused + expired
+
+    for candidate in candidates:
+        if candidate not in leases:
+            try:
+                db.add(WorkerSlot(slot=candidate, owner=owner, lease_expires_at=expires_at))
+                db.commit()
+                return candidate
+            except IntegrityError:
+                db.rollback()  # Taken by a process starting at the same time
+                continue
+        result = db.execute(
+            update(WorkerSlot)
+            .where(WorkerSlot.slot == candidate, WorkerSlot.lease_expires_at < now)
+            .values(owner=owner, lease_expires_at=expires_at)
+        )
+        db.commit()
+        if result.rowcount == 1:
+            return candidate
+    logger.error(f"No free worker slot for {owner}")
+    return None
+
+def renew_worker_slot(db: Session, slot: int, owner: str, lease_seconds: float) -> bool:
+    """Extend the lease; False if the slot is no longer held by `owner`."""
+    result = db.execute(
+        update(WorkerSlot)
+        .where(WorkerSlot.slot == slot, WorkerSlot.owner == owner)
+        .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+    )
+    db.commit()
+    return result.rowcount == 1
+
+def release_worker_slot(db: Session, slot: int, owner: str):
+    db.execute(delete(WorkerSlot).where(WorkerSlot.slot == slot, WorkerSlot.owner == owner))
+    db.commit()
@@ -0,0 +1,99 @@
+# app/db/pool.py
+from collections import deque
+from typing import Dict
+import threading
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from app.config import settings
+
+SLOW_CHECKOUT_MS = 5  # Checkouts slower than this count as having waited
+RECENT_CHECKOUTS = 1000  # Window for the percentiles
+
+
+class PoolWaitStats:
+    """Time spent getting a connection out of a pool (waiting for a free one, or opening an overflow one)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._recent = deque(maxlen=RECENT_CHECKOUTS)
+
+    def record(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            self._recent.append(seconds)
+            if seconds * 1000 > SLOW_CHECKOUT_MS:
+                self.waited += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            checkouts = self.checkouts
+            return {
+                "checkouts": checkouts,
+                "waited": self.waited,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "p50_wait_ms": round(recent[len(recent) // 2] * 1000, 3) if recent else 0.0,
+                "p99_wait_ms": round(recent[int(len(recent) * 0.99)] * 1000, 3) if recent else 0.0,
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout took in `wait_stats`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def recreate(self):
+        # Keep the numbers when the engine disposes/replaces its pool
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - started)
+        return connection
+
+
+def create_pooled_engine(url: str) -> Engine:
+    return create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS
+    )
+
+
+def pool_report(engines: Dict[str, Engine]) -> Dict[str, dict]:
+    """Occupancy and checkout waits per named engine."""
+    report = {}
+    for name, engine in engines.items():
+        pool = engine.pool
+        report[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),  # Negative while the base pool is not full
+            **(pool.wait_stats.snapshot() if isinstance(pool, TimedQueuePool) else {})
+        }
+    return report
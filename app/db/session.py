@@ -1,14 +1,14 @@
 #app/db/session.py
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
+from app.db.pool import create_pooled_engine
 
 # Database URL to connect to MySQL running in Docker container
 DATABASE_URL = settings.DB_URL  # Adjusted for local connection
 
 # Create engine and session
-engine = create_engine(DATABASE_URL, pool_size=10, max_overflow=20)
+engine = create_pooled_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -0,0 +1,150 @@
+# app/db/shards.py
+"""Routing of message storage to shards by room_id.
+
+MESSAGE_SHARDS names the shard databases ("s0=mysql://...,s1=mysql://..."). Each room's
+messages live on exactly one of them, chosen by rendezvous hashing of (shard name, room_id):
+stable across processes and restarts, and adding a shard only re-homes the rooms that hash
+to it. A room can be pinned elsewhere through a ShardPlacement row on the primary; the
+rebalancer (app/scripts/rebalance_shards.py) writes those pins while moving rooms, and every
+process reloads them every SHARD_PLACEMENT_REFRESH_SECONDS.
+
+Users, rooms, memberships and everything else stay on the primary. With MESSAGE_SHARDS
+unset every room routes to the primary and callers keep using their own session.
+"""
+from contextlib import contextmanager
+from typing import Dict, List
+import asyncio
+import hashlib
+from sqlalchemy import Column, Index, MetaData, Table, select
+from sqlalchemy.orm import Session, sessionmaker
+from app.config import settings
+from app.db.pool import create_pooled_engine
+from app.db.session import SessionLocal
+from app.models.message import Message
+from app.models.shard_placement import ShardPlacement
+from app.utils.logger import logger
+
+# Location name of the primary database in placements and routing results
+PRIMARY = "primary"
+
+
+def parse_shard_map(value: str) -> Dict[str, str]:
+    """Parse "name=url,name=url" into an ordered {name: url} map."""
+    shards: Dict[str, str] = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        name, separator, url = entry.partition("=")
+        name, url = name.strip(), url.strip()
+        if not separator or not name or not url:
+            raise ValueError(f"Invalid MESSAGE_SHARDS entry {entry!r}, expected name=url")
+        if name == PRIMARY or name in shards:
+            raise ValueError(f"Duplicate or reserved shard name {name!r} in MESSAGE_SHARDS")
+        shards[name] = url
+    return shards
+
+
+def shard_metadata() -> MetaData:
+    """The messages table as created on a shard: same columns and indexes, no foreign keys
+    (users and rooms live on the primary)."""
+    metadata = MetaData()
+    source = Message.__table__
+    table = Table(source.name, metadata, *[
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+        for column in source.columns
+    ])
+    for index in source.indexes:
+        Index(index.name, *[table.c[column.name] for column in index.columns], unique=index.unique)
+    return metadata
+
+
+def _score(name: str, room_id: int) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{name}:{room_id}".encode(), digest_size=8).digest(), "big")
+
+
+class ShardRouter:
+    def __init__(self, shard_map: Dict[str, str]):
+        self.engines = {name: create_pooled_engine(url) for name, url in shard_map.items()}
+        self._sessions = {
+            name: sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+            for name, shard_engine in self.engines.items()
+        }
+        self.metadata = shard_metadata()
+        self.placements: Dict[int, str] = {}
+
+    @property
+    def sharded(self) -> bool:
+        return bool(self.engines)
+
+    @property
+    def locations(self) -> List[str]:
+        """Every database that may hold messages: the primary (legacy or pinned rooms) and each shard."""
+        return [PRIMARY] + list(self.engines)
+
+    def home_shard(self, room_id: int) -> str:
+        """Where the hash places the room, ignoring pins."""
+        if not self.engines:
+            return PRIMARY
+        return max(self.engines, key=lambda name: _score(name, room_id))
+
+    def shard_for_room(self, room_id: int) -> str:
+        return self.placements.get(room_id) or self.home_shard(room_id)
+
+    def session_factory(self, location: str):
+        return SessionLocal if location == PRIMARY else self._sessions[location]
+
+    def session_factory_for_room(self, room_id: int):
+        return self.session_factory(self.shard_for_room(room_id))
+
+    @contextmanager
+    def location_session(self, db: Session, location: str):
+        """`db` itself for the primary, else a short-lived session on the shard."""
+        if location == PRIMARY:
+            yield db
+            return
+        shard_db = self._sessions[location]()
+        try:
+            yield shard_db
+        finally:
+            shard_db.close()
+
+    def message_session(self, db: Session, room_id: int):
+        """Session holding the room's messages. On the primary this is `db`, so message and
+        summary writes keep sharing one transaction."""
+        return self.location_session(db, self.shard_for_room(room_id))
+
+    def create_tables(self):
+        for shard_engine in self.engines.values():
+            self.metadata.create_all(bind=shard_engine)
+
+    def load_placements(self, db: Session):
+        if not self.sharded:
+            return
+        known = set(self.locations)
+        placements = {}
+        for room_id, location in db.execute(select(ShardPlacement.room_id, ShardPlacement.shard)):
+            if location in known:
+                placements[room_id] = location
+            else:
+                logger.warning(f"Ignoring placement of room {room_id} on unknown shard {location!r}")
+        self.placements = placements
+
+    def _refresh_placements(self):
+        db = SessionLocal()
+        try:
+            self.load_placements(db)
+        finally:
+            db.close()
+
+    async def run_placement_refresher(self, interval: float):
+        """Pick up pins written by the rebalancer (no-op when unsharded)."""
+        if not self.sharded:
+            return
+        while True:
+            try:
+                await asyncio.to_thread(self._refresh_placements)
+            except Exception as e:
+                logger.error(f"Error refreshing shard placements: {str(e)}")
+            await asyncio.sleep(interval)
+
+
+# Initialize shard router (singleton instance)
+shard_router = ShardRouter(parse_shard_map(settings.MESSAGE_SHARDS))
@@ -46,7 +46,7 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes
 
 # Function to authenticate the user (login)
 def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
+    user = db.query(User).filter(User.username == username, User.deleted_at.is_(None)).first()
     if not user:
         logger.warning(f"Authentication failed: User '{username}' not found")
         return None
@@ -71,7 +71,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         if user_id is None:
             logger.warning("Token validation failed: Missing user ID")
             raise credentials_exception
-        user = db.query(User).filter(User.id == int(user_id)).first()
+        user = db.query(User).filter(User.id == int(user_id), User.deleted_at.is_(None)).first()
         if user is None:
             logger.warning(f"Token validation failed: User ID {user_id} not found")
             raise credentials_exception
@@ -1,21 +1,99 @@
 # app/main.py
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import auth, chat
+from app.api import auth, chat, debug
 from app.websockets.chat import chat_websocket
-from app.db.session import Base, engine
+from app.db.session import Base, engine, SessionLocal
+from app.db.shards import shard_router
+from app.crud.room_summary import backfill_room_summaries
 from app.config import settings
 from app.utils.logger import logger
+from app.websockets.read_state import read_state
+from app.websockets.connection import manager
+from app.websockets.drain import shutdown_drain
+from app.utils.admission import admission, AdmissionMiddleware, WS_TRY_AGAIN_LATER
+from app.utils.diagnostics import diagnostics
+from app.utils.deletion_worker import deletion_worker
+from app.utils.room_directory import room_directory
+from app.utils.worker_slots import worker_slot_lease
+from app.utils.conditional import room_versions, ConditionalGetMiddleware
+from app.utils import query_budget
+from app.utils.query_budget import QueryBudgetMiddleware
+from contextlib import asynccontextmanager, suppress
+import asyncio
 
-# Create database tables
+# Create database tables (and the messages table on each message shard)
 Base.metadata.create_all(bind=engine)
+shard_router.create_tables()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # A unique ID worker slot for this process; startup fails if none can be leased
+    worker_slot_lease.claim()
+
+    # Rooms created before room_summaries existed (or bulk-loaded) need an inbox row
+    db = SessionLocal()
+    try:
+        shard_router.load_placements(db)
+        backfill_room_summaries(db)
+        room_directory.load(db)
+    finally:
+        db.close()
+
+    # Background writer for read cursors sent over WebSockets
+    flusher = asyncio.create_task(read_state.run_flusher(settings.READ_CURSOR_FLUSH_INTERVAL_SECONDS))
+    # Coalesced join/leave announcements
+    presence = asyncio.create_task(manager.run_presence_flusher(
+        settings.PRESENCE_FLUSH_INTERVAL_SECONDS, defer=lambda: admission.degraded or admission.draining
+    ))
+    # Rooms pinned to a shard by the rebalancer
+    placements = asyncio.create_task(shard_router.run_placement_refresher(settings.SHARD_PLACEMENT_REFRESH_SECONDS))
+    # Messages posted through other processes, for conditional GETs
+    versions = asyncio.create_task(room_versions.run_refresher(settings.ROOM_VERSION_REFRESH_SECONDS))
+    # Rooms created/deleted by other processes, for the in-memory room directory
+    directory = asyncio.create_task(room_directory.run_refresher(
+        settings.ROOM_DIRECTORY_REFRESH_SECONDS, settings.ROOM_DIRECTORY_REBUILD_SECONDS
+    ))
+    # Event-loop lag sampling for admission control
+    lag_monitor = asyncio.create_task(admission.run_lag_monitor())
+    # Chunked purges of deleted users and rooms (resumes jobs left over from a crash)
+    deleter = asyncio.create_task(deletion_worker.run(settings.DELETION_POLL_INTERVAL_SECONDS))
+    if settings.DIAGNOSTICS_ENABLED:
+        diagnostics.start()
+    # Drain sockets in waves on SIGTERM/SIGINT, before the server closes them all at once
+    shutdown_drain.install_signal_handlers()
+    yield
+    # No-op if a signal already ran the drain
+    await shutdown_drain.drain()
+    await diagnostics.stop()
+    for task in (deleter, lag_monitor, directory, versions, placements, presence, flusher):
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    worker_slot_lease.release()
+
 
 # Create FastAPI app instance
 app = FastAPI(
     title=settings.APP_NAME,
-    version=settings.APP_VERSION
+    version=settings.APP_VERSION,
+    lifespan=lifespan
 )
 
+# Load shedding for REST calls (503 + Retry-After while overloaded); added first so the
+# CORS middleware still wraps shed responses
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
+# SQL statement counting per request (opt-in)
+if settings.QUERY_STATS_ENABLED:
+    query_budget.install()
+    app.add_middleware(QueryBudgetMiddleware)
+
+# 304 for room GETs whose ETag is still current; outside load shedding and query counting
+# since it never reaches the app or the database
+app.add_middleware(ConditionalGetMiddleware, versions=room_versions)
+
 # CORS configuration
 origins = [
     settings.ALLOWED_ORIGINS,  # You can specify a list of allowed origins
@@ -32,11 +110,23 @@ app.add_middleware(
 # Include API routers
 app.include_router(auth.router, prefix="/api", tags=["Authentication"])
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
+app.include_router(debug.router, prefix="/api/debug", tags=["Debug"])
 
 # WebSocket endpoint
 @app.websocket("/ws/chat/{room_id}")
-async def websocket_endpoint(websocket: WebSocket, room_id: int, token: str = None):
-    await chat_websocket(websocket, room_id, token=token)
+async def websocket_endpoint(websocket: WebSocket, room_id: int, token: str = None, ticket: str = None):
+    # Refuse the connection before any DB work when the worker or room is over budget (or
+    # draining). Closing before accept() would turn into an HTTP 403 at the handshake, so
+    # accept first and close with 1013 for clients to back off and retry.
+    rejection = admission.admit_websocket(room_id)
+    if rejection:
+        await websocket.accept()
+        await websocket.close(code=WS_TRY_AGAIN_LATER, reason="Server busy, try again later")
+        return
+    try:
+        await chat_websocket(websocket, room_id, token=token, ticket=ticket)
+    finally:
+        admission.release_websocket(room_id)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,22 @@
+# app/models/deletion_job.py
+from sqlalchemy import Column, Integer, String, DateTime
+from app.db.session import Base
+from app.utils.ids import IdType, next_id
+from datetime import datetime
+
+
+class DeletionJob(Base):
+    """Progress of a chunked background deletion; committed with every chunk so it can resume."""
+    __tablename__ = "deletion_jobs"
+
+    id = Column(IdType, primary_key=True, default=next_id)
+    entity_type = Column(String(20), nullable=False)  # "user" | "room"
+    entity_id = Column(IdType, nullable=False)
+    requested_by = Column(IdType, nullable=True)
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending | running | done
+    phase = Column(String(30), nullable=False)
+    rows_deleted = Column(Integer, nullable=False, default=0)
+    error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
@@ -1,17 +1,29 @@
 # app/models/message.py
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from app.db.session import Base
+from app.utils.ids import IdType, next_id
 from datetime import datetime
 
 class Message(Base):
     __tablename__ = "messages"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(IdType, primary_key=True, index=True, default=next_id)
     text = Column(String(1000))
-    sender_id = Column(Integer, ForeignKey("users.id"))
-    room_id = Column(Integer, ForeignKey("chat_rooms.id"))
+    sender_id = Column(IdType, ForeignKey("users.id"))
+    room_id = Column(IdType, ForeignKey("chat_rooms.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Client-supplied key making REST batch posts safe to retry (unique per room and sender)
+    idempotency_key = Column(String(64), nullable=True)
 
     sender = relationship("User", back_populates="messages")
-    room = relationship("ChatRoom", back_populates="messages")
\ No newline at end of file
+    room = relationship("ChatRoom", back_populates="messages")
+
+    # Keyset scans over a room's history (export, pagination) walk the first index, and the
+    # chunks of a user deletion the second. The third lives on the same shard as the room, so
+    # a message and its key are stored atomically.
+    __table_args__ = (
+        Index("ix_messages_room_id_id", "room_id", "id"),
+        Index("ix_messages_sender_id_id", "sender_id", "id"),
+        Index("uq_messages_room_sender_idempotency", "room_id", "sender_id", "idempotency_key", unique=True),
+    )
\ No newline at end of file
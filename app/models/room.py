@@ -1,16 +1,19 @@
 # app/models/room.py
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime
 from sqlalchemy.orm import relationship
 from app.db.session import Base
+from app.utils.ids import IdType, next_id
 from app.models.room_users import room_users
 
 
 class ChatRoom(Base):
     __tablename__ = "chat_rooms"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(IdType, primary_key=True, index=True, default=next_id)
     name = Column(String(100), index=True)
-    creator_id = Column(Integer, ForeignKey("users.id"))
+    creator_id = Column(IdType, ForeignKey("users.id"))
+    # Set when deletion is requested; the row itself is purged by a background deletion job
+    deleted_at = Column(DateTime, nullable=True)
 
     users = relationship("User", secondary=room_users, back_populates="rooms")
     messages = relationship("Message", back_populates="room")
@@ -0,0 +1,18 @@
+# app/models/room_summary.py
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from app.db.session import Base
+from app.utils.ids import IdType
+
+
+class RoomSummary(Base):
+    """Denormalized per-room inbox row, maintained by the room and message write paths."""
+    __tablename__ = "room_summaries"
+
+    room_id = Column(IdType, ForeignKey("chat_rooms.id", ondelete="CASCADE"), primary_key=True)
+    member_count = Column(Integer, nullable=False, default=0)
+    # Time-ordered ID of the latest activity: the last message, or the room itself when empty
+    last_activity_id = Column(IdType, nullable=False, index=True)
+    last_message_id = Column(IdType, nullable=True)
+    last_message_text = Column(String(200), nullable=True)
+    last_message_sender_id = Column(IdType, nullable=True, index=True)  # Previews to clear when the sender is deleted
+    last_message_at = Column(DateTime, nullable=True)
@@ -1,10 +1,13 @@
 # app/models/room_users.py
-from sqlalchemy import Table, Column, Integer, ForeignKey
+from sqlalchemy import Table, Column, ForeignKey
 from app.db.session import Base
+from app.utils.ids import IdType
 
 room_users = Table(
     "room_users",
     Base.metadata,
-    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
-    Column("room_id", Integer, ForeignKey("chat_rooms.id", ondelete="CASCADE"), primary_key=True),
+    Column("user_id", IdType, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+    Column("room_id", IdType, ForeignKey("chat_rooms.id", ondelete="CASCADE"), primary_key=True),
+    # Read cursor: ID of the last message this member has read in the room (NULL = nothing read)
+    Column("last_read_message_id", IdType, nullable=True),
 )
@@ -0,0 +1,14 @@
+# app/models/shard_placement.py
+from sqlalchemy import Column, String, DateTime
+from app.db.session import Base
+from app.utils.ids import IdType
+from datetime import datetime
+
+
+class ShardPlacement(Base):
+    """Pins a room's messages to a named shard, overriding the hash placement (set by the rebalancer)."""
+    __tablename__ = "message_shard_placements"
+
+    room_id = Column(IdType, primary_key=True)
+    shard = Column(String(64), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
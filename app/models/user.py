@@ -1,17 +1,20 @@
 # app/models/user.py
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, String, DateTime
 from sqlalchemy.orm import relationship
 from app.db.session import Base
+from app.utils.ids import IdType, next_id
 from app.models.room_users import room_users
 
 
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(IdType, primary_key=True, index=True, default=next_id)
     username = Column(String(50), unique=True, index=True)
     email = Column(String(100), unique=True, index=True)
     password = Column(String(255))
+    # Set when deletion is requested; the row itself is purged by a background deletion job
+    deleted_at = Column(DateTime, nullable=True)
 
     messages = relationship("Message", back_populates="sender")
     rooms = relationship("ChatRoom", secondary=room_users, back_populates="users")
\ No newline at end of file
@@ -0,0 +1,12 @@
+# app/models/worker_slot.py
+from sqlalchemy import Column, Integer, String, DateTime
+from app.db.session import Base
+
+
+class WorkerSlot(Base):
+    """Lease on one ID worker slot (see app/utils/worker_slots.py); a row past its expiry is free."""
+    __tablename__ = "id_worker_slots"
+
+    slot = Column(Integer, primary_key=True, autoincrement=False)
+    owner = Column(String(100), nullable=False)
+    lease_expires_at = Column(DateTime, nullable=False)
@@ -1,6 +1,6 @@
 
 #app/schemas/auth.py
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class LoginRequest(BaseModel):
     username: str
@@ -10,5 +10,4 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
@@ -1,5 +1,5 @@
 # app/schemas/message.py
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from typing import List, Optional
 from datetime import datetime
 
@@ -13,5 +13,19 @@ class MessageResponse(BaseModel):
     room_id: int
     created_at: datetime
 
-    class Config:
-        orm_mode = True  # Tells Pydantic to treat SQLAlchemy models as dicts
+    model_config = ConfigDict(from_attributes=True)  # Tells Pydantic to treat SQLAlchemy models as dicts
+
+# Largest batch accepted by POST /api/chat/messages
+MAX_BATCH_MESSAGES = 500
+
+class MessageBatchItem(BaseModel):
+    room_id: int
+    text: str = Field(min_length=1, max_length=1000)
+    # Retrying an item with the same key (per room and sender) returns the stored message instead of posting twice
+    idempotency_key: Optional[str] = Field(default=None, min_length=1, max_length=64)
+
+class MessageBatchCreate(BaseModel):
+    messages: List[MessageBatchItem] = Field(min_length=1, max_length=MAX_BATCH_MESSAGES)
+
+# Precompiled validator/serializer for message pages
+message_list_adapter = TypeAdapter(List[MessageResponse])
@@ -1,5 +1,5 @@
 # app/schemas/room.py
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 from typing import List, Optional
 from app.schemas.user import UserResponse
 
@@ -13,6 +13,8 @@ class ChatRoomResponse(BaseModel):
     creator_id: int
     users: List[UserResponse]  # List of usernames in the room
 
-    class Config:
-        orm_mode = True  # Tells Pydantic to treat SQLAlchemy models as dicts
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)  # Tells Pydantic to treat SQLAlchemy models as dicts
+
+# Precompiled validators/serializers for room responses
+room_adapter = TypeAdapter(ChatRoomResponse)
+room_list_adapter = TypeAdapter(List[ChatRoomResponse])
@@ -1,5 +1,5 @@
 # app/schemas/user.py
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 from typing import Optional
 
 class UserCreate(BaseModel):
@@ -13,5 +13,7 @@ class UserResponse(BaseModel):
     username: str
     email: str
 
-    class Config:
-        orm_mode = True  # Tells Pydantic to treat SQLAlchemy models as dicts
+    model_config = ConfigDict(from_attributes=True)  # Tells Pydantic to treat SQLAlchemy models as dicts
+
+# Precompiled validator/serializer for user responses
+user_adapter = TypeAdapter(UserResponse)
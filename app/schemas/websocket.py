@@ -1,8 +1,11 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Optional
 
 # WebSocket Message Schemas
 class WSMessage(BaseModel):
     type: str
     text: Optional[str] = None
-    is_typing: Optional[bool] = None
\ No newline at end of file
+    is_typing: Optional[bool] = None
+    # type == "read": advance the read cursor in this room and/or others ({room_id: message_id})
+    message_id: Optional[int] = None
+    cursors: Optional[Dict[int, int]] = None
\ No newline at end of file
@@ -0,0 +1,102 @@
+# app/scripts/bench_conditional.py
+"""Poll-cost benchmark for the room endpoints: full responses vs. conditional GETs.
+
+Usage:
+    python -m app.scripts.bench_conditional --members 50 --messages 100 --polls 500
+
+Creates a room with --members users and --messages messages in the configured database
+(use a scratch DB_URL, e.g. sqlite:////tmp/bench.db), then polls each endpoint three ways:
+
+  full         no If-None-Match: queries + serialization every time (the old behaviour)
+  revalidated  If-None-Match, but the ETag is not remembered (first poll after a change or
+               on another worker): the endpoint runs, then answers 304 without a body
+  304          If-None-Match with a current ETag: answered by ConditionalGetMiddleware
+
+Requests are sent straight to the ASGI app on one event loop (no network, no test-client
+thread), so the numbers are server cost; GET /health is printed as the floor.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.db.session import Base, engine, SessionLocal
+from app.dependencies.auth import create_access_token
+from app.main import app
+from app.models.message import Message
+from app.models.room import ChatRoom
+from app.models.user import User
+from app.crud.room_summary import create_room_summary
+from app.utils.conditional import room_versions
+from app.utils.ids import next_id
+from app.utils.query_budget import assert_query_budget
+from app.utils.worker_slots import worker_slot_lease
+
+
+def _fixtures(members: int, messages: int):
+    db = SessionLocal()
+    try:
+        users = [User(id=next_id(), username=f"bench_{next_id()}", email=f"bench_{next_id()}@example.com", password="x") for _ in range(members)]
+        room = ChatRoom(id=next_id(), name="bench room", creator_id=users[0].id)
+        room.users = users
+        db.add_all(users + [room])
+        create_room_summary(db, room.id, member_count=members)
+        db.add_all(Message(id=next_id(), text=f"message {i} " * 5, sender_id=users[i % members].id, room_id=room.id) for i in range(messages))
+        db.commit()
+        return room.id, users[0].id
+    finally:
+        db.close()
+
+
+async def _measure(client, url, headers, polls, forget_user_id):
+    statuses = set()
+    queries = 0
+    elapsed = 0.0
+    for _ in range(polls):
+        if forget_user_id is not None:
+            room_versions.forget_user(forget_user_id)
+        with assert_query_budget(10 ** 6) as stats:
+            started = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            elapsed += time.perf_counter() - started
+        statuses.add(response.status_code)
+        queries += stats.count
+    return elapsed / polls * 1e6, queries / polls, sorted(statuses)
+
+
+async def _run(args):
+    Base.metadata.create_all(bind=engine)
+    worker_slot_lease.claim()
+    try:
+        room_id, user_id = _fixtures(max(args.members, 1), args.messages)
+    finally:
+        worker_slot_lease.release()
+    auth = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+    # No lifespan: background tasks would add noise
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        print(f"{'endpoint':32} {'mode':12} {'us/poll':>9} {'queries':>8} {'status':>7}")
+        us, queries, statuses = await _measure(client, "/health", {}, args.polls, None)
+        print(f"{'/health':32} {'floor':12} {us:9.1f} {queries:8.1f} {'/'.join(map(str, statuses)):>7}")
+        for url in (f"/api/chat/rooms/{room_id}", f"/api/chat/rooms/{room_id}/users", f"/api/chat/rooms/{room_id}/messages?limit={args.messages}"):
+            etag = (await client.get(url, headers=auth)).headers["etag"]
+            conditional = {**auth, "If-None-Match": etag}
+            modes = [("full", auth, None), ("revalidated", conditional, user_id), ("304", conditional, None)]
+            label = url.replace(str(room_id), "{id}").split("?")[0]
+            for mode, headers, forget_user_id in modes:
+                us, queries, statuses = await _measure(client, url, headers, args.polls, forget_user_id)
+                print(f"{label:32} {mode:12} {us:9.1f} {queries:8.1f} {'/'.join(map(str, statuses)):>7}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark polling with and without conditional GETs")
+    parser.add_argument("--members", type=int, default=50, help="Users in the room")
+    parser.add_argument("--messages", type=int, default=100, help="Messages in the room (and per page)")
+    parser.add_argument("--polls", type=int, default=500, help="Requests per measurement")
+    args = parser.parse_args(argv)
+
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+# app/scripts/bulk_load.py
+"""Bulk loader for users, rooms, memberships and messages.
+
+Usage:
+    python -m app.scripts.bulk_load generate --users 100000 --rooms 5000 --members-per-room 20 --messages 5000000
+    python -m app.scripts.bulk_load import --users users.ndjson --rooms rooms.csv --memberships members.ndjson --messages messages.ndjson
+
+Rows are written with Core executemany inserts (multi-row VALUES on MySQL) on a single
+connection per database, committing every --batch-size rows; messages are routed to
+their room's shard when MESSAGE_SHARDS is set. Non-unique secondary indexes are dropped
+for the duration of the load and rebuilt at the end, and passwords are hashed once
+instead of once per user.
+"""
+import argparse
+import csv
+import json
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+from functools import lru_cache
+from collections import defaultdict
+from contextlib import ExitStack
+from itertools import islice
+
+from app.db.session import Base, engine, SessionLocal
+from app.db.shards import PRIMARY, shard_router
+from app.dependencies.auth import get_password_hash
+from app.models.user import User
+from app.models.room import ChatRoom
+from app.models.message import Message
+from app.models.room_users import room_users
+from app.utils.logger import logger
+from app.utils.ids import next_id
+from app.utils.worker_slots import worker_slot_lease
+
+# Load order matters for foreign keys when they are enforced
+TABLES = {
+    "users": User.__table__,
+    "rooms": ChatRoom.__table__,
+    "memberships": room_users,
+    "messages": Message.__table__,
+}
+
+
+def _batched(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+@lru_cache(maxsize=1024)
+def _hash_password(password: str) -> str:
+    # bcrypt is ~100ms per call; identical plaintexts (common in fixtures) are hashed once
+    return get_password_hash(password)
+
+
+# ---------------------------------------------------------------------------
+# Bulk-load session tuning
+# ---------------------------------------------------------------------------
+
+def _deferrable_indexes(tables):
+    """Non-unique secondary indexes that can be rebuilt after the load."""
+    return [index for table in tables for index in table.indexes if not index.unique]
+
+
+def _begin_bulk_session(conn, indexes):
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        conn.exec_driver_sql("PRAGMA synchronous = OFF")
+        conn.exec_driver_sql("PRAGMA journal_mode = MEMORY")
+        conn.exec_driver_sql("PRAGMA cache_size = -262144")  # 256 MiB
+    elif dialect == "mysql":
+        conn.exec_driver_sql("SET unique_checks = 0")
+        conn.exec_driver_sql("SET foreign_key_checks = 0")
+    conn.commit()
+
+    dropped = []
+    if indexes:
+        for index in indexes:
+            try:
+                index.drop(conn)
+                dropped.append(index)
+            except Exception as e:  # Index may not exist on an older schema
+                logger.debug(f"Skipping index {index.name}: {str(e)}")
+                conn.rollback()
+        conn.commit()
+        logger.info(f"Deferred maintenance of {len(dropped)} secondary indexes")
+    return dropped
+
+
+def _end_bulk_session(conn, dropped):
+    started = time.perf_counter()
+    for index in dropped:
+        index.create(conn)
+    conn.commit()
+    if dropped:
+        logger.info(f"Rebuilt {len(dropped)} secondary indexes in {time.perf_counter() - started:.1f}s")
+
+    if conn.dialect.name == "mysql":
+        conn.exec_driver_sql("SET unique_checks = 1")
+        conn.exec_driver_sql("SET foreign_key_checks = 1")
+        conn.commit()
+
+
+def _insert_rows(conns, name: str, rows, batch_size: int) -> int:
+    """Insert into the primary connection; messages go to their room's shard connection."""
+    table = TABLES[name]
+    statement = table.insert()
+    total = 0
+    started = time.perf_counter()
+    for batch in _batched(rows, batch_size):
+        if name == "messages" and shard_router.sharded:
+            by_location = defaultdict(list)
+            for row in batch:
+                by_location[shard_router.shard_for_room(row["room_id"])].append(row)
+        else:
+            by_location = {PRIMARY: batch}
+        for location, location_rows in by_location.items():
+            conns[location].execute(statement, location_rows)
+            conns[location].commit()
+        total += len(batch)
+    elapsed = time.perf_counter() - started
+    rate = total / elapsed if elapsed else 0
+    logger.info(f"Inserted {total} {name} in {elapsed:.1f}s ({rate * 60:,.0f} rows/min)")
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Import from NDJSON / CSV
+# ---------------------------------------------------------------------------
+
+def _read_records(path: str):
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _column_default(column):
+    default = column.default
+    if default is None:
+        return None
+    if default.is_callable:
+        return default.arg(None)  # SQLAlchemy wraps zero-argument callables to take a context
+    return default.arg if default.is_scalar else None
+
+
+def _coerce(table, record: dict) -> dict:
+    # Every row carries every column: an executemany batch is compiled from its first row's
+    # keys, so a column missing or extra in later rows would fail the batch or be dropped
+    row = {}
+    for column in table.columns:
+        value = record.get(column.name)
+        if value is None or value == "":
+            row[column.name] = _column_default(column)
+            continue
+        python_type = column.type.python_type
+        if python_type is datetime and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        elif python_type is int and not isinstance(value, int):
+            value = int(value)
+        row[column.name] = value
+    return row
+
+
+def _import_rows(name: str, path: str):
+    table = TABLES[name]
+    for record in _read_records(path):
+        if name == "users":
+            # Pre-hashed passwords are loaded as-is; plaintext ones are hashed (memoized)
+            if record.get("password_hash"):
+                record["password"] = record.pop("password_hash")
+            elif record.get("password"):
+                record["password"] = _hash_password(record["password"])
+        yield _coerce(table, record)
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+def _room_members(room_index: int, users: int, members_per_room: int):
+    """Deterministic membership: room i holds a contiguous window of users, so no lookups are needed."""
+    start = (room_index * members_per_room) % users
+    return [(start + j) % users for j in range(min(members_per_room, users))]
+
+
+def _generate(conns, args):
+    # Generated IDs are kept in compact int64 arrays so memberships and senders can refer to them
+    user_ids = array("q", (next_id() for _ in range(args.users)))
+    room_ids = array("q", (next_id() for _ in range(args.rooms)))
+    password = _hash_password(args.password)
+    rng = random.Random(args.seed)
+
+    users = (
+        {"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com", "password": password}
+        for user_id in user_ids
+    )
+    _insert_rows(conns, "users", users, args.batch_size)
+
+    rooms = (
+        {"id": room_id, "name": f"room {i}", "creator_id": user_ids[_room_members(i, args.users, args.members_per_room)[0]]}
+        for i, room_id in enumerate(room_ids)
+    )
+    _insert_rows(conns, "rooms", rooms, args.batch_size)
+
+    memberships = (
+        {"user_id": user_ids[member], "room_id": room_ids[i]}
+        for i in range(args.rooms)
+        for member in _room_members(i, args.users, args.members_per_room)
+    )
+    _insert_rows(conns, "memberships", memberships, args.batch_size)
+
+    started_at = datetime.utcnow() - timedelta(days=args.days)
+    step = timedelta(days=args.days) / max(args.messages, 1)
+    members = min(args.members_per_room, args.users)
+
+    def messages():
+        for i in range(args.messages):
+            room_index = rng.randrange(args.rooms)
+            sender = ((room_index * args.members_per_room) + rng.randrange(members)) % args.users
+            yield {
+                "id": next_id(),
+                "text": f"synthetic message {i}",
+                "sender_id": user_ids[sender],
+                "room_id": room_ids[room_index],
+                "created_at": started_at + step * i,
+            }
+
+    _insert_rows(conns, "messages", messages(), args.batch_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load chat data")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per executemany batch / commit")
+    parser.add_argument("--keep-indexes", action="store_true", help="Maintain secondary indexes during the load")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="Import NDJSON or CSV files (format chosen by extension)")
+    for name in TABLES:
+        importer.add_argument(f"--{name}", metavar="PATH")
+
+    generator = commands.add_parser("generate", help="Generate synthetic data")
+    generator.add_argument("--users", type=int, default=1000)
+    generator.add_argument("--rooms", type=int, default=100)
+    generator.add_argument("--members-per-room", type=int, default=10)
+    generator.add_argument("--messages", type=int, default=100000)
+    generator.add_argument("--days", type=int, default=30, help="Spread message timestamps over this many days")
+    generator.add_argument("--password", default="password", help="Password shared by all generated users")
+    generator.add_argument("--seed", type=int, default=None)
+
+    args = parser.parse_args(argv)
+    if args.command == "generate" and (args.users < 1 or args.rooms < 1):
+        parser.error("--users and --rooms must be at least 1")
+
+    Base.metadata.create_all(bind=engine)
+    shard_router.create_tables()
+    with SessionLocal() as db:
+        shard_router.load_placements(db)
+    worker_slot_lease.claim()
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        stack.callback(worker_slot_lease.release)
+        conns = {PRIMARY: stack.enter_context(engine.connect())}
+        conns.update({name: stack.enter_context(shard_engine.connect()) for name, shard_engine in shard_router.engines.items()})
+        dropped = {}
+        try:
+            for location, conn in conns.items():
+                tables = TABLES.values() if location == PRIMARY else shard_router.metadata.tables.values()
+                dropped[location] = _begin_bulk_session(conn, [] if args.keep_indexes else _deferrable_indexes(tables))
+            if args.command == "generate":
+                _generate(conns, args)
+            else:
+                for name in TABLES:
+                    path = getattr(args, name)
+                    if path:
+                        _insert_rows(conns, name, _import_rows(name, path), args.batch_size)
+        finally:
+            for location, indexes in dropped.items():
+                _end_bulk_session(conns[location], indexes)
+    logger.info(f"Bulk load finished in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
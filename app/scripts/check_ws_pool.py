@@ -0,0 +1,204 @@
+# app/scripts/check_ws_pool.py
+"""Check that idle WebSockets do not hold database connections.
+
+Usage:
+    DB_URL=sqlite:////tmp/ws_pool.db python -m app.scripts.check_ws_pool --sockets 10000 --rooms 100
+
+Runs with DB_POOL_SIZE=10, DB_MAX_OVERFLOW=0 and a short DB_POOL_TIMEOUT_SECONDS unless
+they are set, so a handler that kept its session for the life of the socket would run out
+of connections after 10 sockets and fail the handshakes (and REST calls) that follow.
+The sockets are opened in-process against the ASGI app (no network, no file descriptors),
+each authenticating with an access token against the database. With all of them idle it
+checks that no connection is checked out and that REST calls get a connection without
+waiting, then sends one message per --senders sockets and checks again. Exits non-zero
+if any check fails.
+"""
+import os
+
+# Must be set before the engine is created
+os.environ.setdefault("DB_POOL_SIZE", "10")
+os.environ.setdefault("DB_MAX_OVERFLOW", "0")
+os.environ.setdefault("DB_POOL_TIMEOUT_SECONDS", "2")
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import httpx
+
+from app.config import settings
+from app.db.session import Base, engine, SessionLocal
+from app.dependencies.auth import create_access_token
+from app.main import app
+from app.models.message import Message
+from app.models.room import ChatRoom
+from app.models.user import User
+from app.crud.room_summary import create_room_summary
+from app.utils.ids import next_id
+from app.utils.worker_slots import worker_slot_lease
+
+
+class FakeWebSocket:
+    """Client side of one in-process ASGI WebSocket connection."""
+
+    def __init__(self, path: str, query: str):
+        self.scope = {
+            "type": "websocket",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query.encode(),
+            "headers": [],
+            "scheme": "ws",
+            "server": ("check", 80),
+            "client": ("127.0.0.1", 0),
+            "subprotocols": [],
+        }
+        self.incoming = asyncio.Queue()
+        self.accepted = asyncio.Event()
+        self.closed = None  # (code, reason) once the server closes
+        self.frames = 0
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, message):
+        if message["type"] == "websocket.accept":
+            self.accepted.set()
+        elif message["type"] == "websocket.close":
+            self.closed = (message.get("code"), message.get("reason"))
+            self.accepted.set()
+        elif message["type"] == "websocket.send":
+            self.frames += 1
+
+    def run(self):
+        self.incoming.put_nowait({"type": "websocket.connect"})
+        task = asyncio.create_task(app(self.scope, self.receive, self.send))
+        task.add_done_callback(self._finished)
+        return task
+
+    def _finished(self, task):
+        # A handler that failed (e.g. pool timeout) before accepting counts as a refused handshake
+        if not self.accepted.is_set():
+            error = task.exception() if not task.cancelled() else None
+            self.closed = (None, repr(error))
+            self.accepted.set()
+
+    def send_text(self, text: str):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": text})
+
+    def disconnect(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+
+def _fixtures(sockets: int, rooms: int):
+    """One user per socket, spread over `rooms` rooms; returns [(room_id, user_id)]."""
+    db = SessionLocal()
+    try:
+        room_objects = [ChatRoom(id=next_id(), name=f"pool check {i}") for i in range(rooms)]
+        pairs = []
+        for i in range(sockets):
+            user = User(id=next_id(), username=f"pool_{next_id()}", email=f"pool_{next_id()}@example.com", password="x")
+            room = room_objects[i % rooms]
+            room.users.append(user)
+            db.add(user)
+            pairs.append((room.id, user.id))
+        db.add_all(room_objects)
+        for room in room_objects:
+            create_room_summary(db, room.id, member_count=len(room.users))
+        db.commit()
+        return pairs
+    finally:
+        db.close()
+
+
+def _check(ok: bool, label: str, failures: list):
+    print(f"  [{'ok' if ok else 'FAIL'}] {label}")
+    if not ok:
+        failures.append(label)
+
+
+async def _run(args) -> list:
+    failures = []
+    pool = engine.pool
+    print(f"Pool: size={settings.DB_POOL_SIZE} max_overflow={settings.DB_MAX_OVERFLOW} timeout={settings.DB_POOL_TIMEOUT_SECONDS}s")
+    Base.metadata.create_all(bind=engine)
+    pairs = _fixtures(args.sockets, max(args.rooms, 1))
+
+    started = time.perf_counter()
+    sockets, tasks = [], []
+    for room_id, user_id in pairs:
+        token = create_access_token({"sub": str(user_id)})
+        websocket = FakeWebSocket(f"/ws/chat/{room_id}", f"token={token}")
+        sockets.append(websocket)
+        tasks.append(websocket.run())
+        if len(tasks) % 1000 == 0:
+            await asyncio.gather(*(websocket.accepted.wait() for websocket in sockets))
+    await asyncio.gather(*(websocket.accepted.wait() for websocket in sockets))
+    open_sockets = [websocket for websocket in sockets if websocket.closed is None]
+    print(f"{len(open_sockets)}/{len(sockets)} sockets open after {time.perf_counter() - started:.1f}s")
+    _check(len(open_sockets) == len(sockets), "every handshake accepted", failures)
+    _check(pool.checkedout() == 0, f"no connection checked out with all sockets idle (checked out: {pool.checkedout()})", failures)
+    if failures:
+        return failures  # The pool is exhausted; the checks below would only time out
+
+    # REST traffic while the sockets idle
+    room_id, user_id = pairs[0]
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+    waits_before = pool.wait_stats.snapshot()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check") as client:
+        statuses = set()
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            statuses.add((await client.get(f"/api/chat/rooms/{room_id}/users", headers=headers)).status_code)
+        elapsed = time.perf_counter() - started
+    waits = pool.wait_stats.snapshot()
+    print(f"{args.requests} REST calls in {elapsed:.2f}s; pool waits: {json.dumps(waits)}")
+    _check(statuses == {200}, f"REST calls succeed (statuses: {sorted(statuses)})", failures)
+    _check(waits["timeouts"] == waits_before["timeouts"] == 0, "no pool checkout timed out", failures)
+
+    # Persist a message from some of the sockets
+    senders = sockets[::max(len(sockets) // max(args.senders, 1), 1)][:args.senders]
+    for websocket in senders:
+        websocket.send_text(json.dumps({"text": "pool check"}))
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        db = SessionLocal()
+        try:
+            stored = db.query(Message).filter(Message.text == "pool check").count()
+        finally:
+            db.close()
+        if stored >= len(senders):
+            break
+    _check(stored >= len(senders), f"{len(senders)} messages stored over the sockets (stored: {stored})", failures)
+    _check(pool.checkedout() == 0, f"no connection checked out after the writes (checked out: {pool.checkedout()})", failures)
+
+    for websocket in sockets:
+        websocket.disconnect()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that idle WebSockets do not pin pooled connections")
+    parser.add_argument("--sockets", type=int, default=10000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=200, help="REST calls made while the sockets idle")
+    parser.add_argument("--senders", type=int, default=100, help="Sockets that send one message")
+    args = parser.parse_args(argv)
+
+    # Fixtures and the messages sent over the sockets need IDs; the app's lifespan is not run
+    worker_slot_lease.claim()
+    try:
+        failures = asyncio.run(_run(args))
+    finally:
+        worker_slot_lease.release()
+    print("PASS" if not failures else f"FAIL: {', '.join(failures)}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# app/scripts/rebalance_shards.py
+"""Move rooms' messages between message shards.
+
+Usage:
+    python -m app.scripts.rebalance_shards status
+    python -m app.scripts.rebalance_shards move --room 123 --to s2 [--dry-run]
+    python -m app.scripts.rebalance_shards pin-all
+    python -m app.scripts.rebalance_shards rebalance [--dry-run]
+
+A move is safe while the app is serving traffic:
+  1. copy the room's messages to the target (batches, skipping IDs already there)
+  2. pin the room to the target on the primary; running processes pick the pin up within
+     SHARD_PLACEMENT_REFRESH_SECONDS
+  3. wait --settle-seconds (two refresh intervals by default)
+  4. copy again to catch messages written to the source before every process switched,
+     then delete the room's messages from the source
+
+Adding a shard: run `pin-all` with the old MESSAGE_SHARDS, deploy the new map, then run
+`rebalance`. Pins keep every room where its messages are until `rebalance` moves the rooms
+that hash to the new shard and clears the pins. The same sequence moves existing messages
+off the primary when sharding is first enabled. `rebalance` also sweeps up "stray" messages
+that sit anywhere other than where their room routes to.
+"""
+import argparse
+import time
+from itertools import islice
+
+from sqlalchemy import delete, func, insert, select
+
+from app.config import settings
+from app.db.session import Base, engine, SessionLocal
+from app.db.shards import shard_router
+from app.models.message import Message
+from app.models.room import ChatRoom
+from app.models.shard_placement import ShardPlacement
+from app.models.user import User  # Message.sender needs the User mapper
+from app.utils.logger import logger
+
+MESSAGES = Message.__table__
+
+
+def _batched(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _session(location: str):
+    return shard_router.session_factory(location)()
+
+
+def copy_room(room_id: int, source: str, target: str, batch_size: int) -> int:
+    """Copy the room's messages from source to target, skipping IDs the target already has."""
+    copied = 0
+    last_id = 0
+    with _session(source) as src, _session(target) as dst:
+        while True:
+            rows = src.execute(
+                select(MESSAGES)
+                .where(MESSAGES.c.room_id == room_id, MESSAGES.c.id > last_id)
+                .order_by(MESSAGES.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            ids = [row.id for row in rows]
+            present = set(dst.execute(select(MESSAGES.c.id).where(MESSAGES.c.id.in_(ids))).scalars())
+            missing = [row._asdict() for row in rows if row.id not in present]
+            if missing:
+                dst.execute(insert(MESSAGES), missing)
+                dst.commit()
+                copied += len(missing)
+            if len(rows) < batch_size:
+                break
+            last_id = ids[-1]
+    return copied
+
+
+def purge_room(room_id: int, location: str, batch_size: int) -> int:
+    """Delete the room's messages from one location in bounded transactions."""
+    purged = 0
+    with _session(location) as db:
+        while True:
+            ids = db.execute(
+                select(MESSAGES.c.id).where(MESSAGES.c.room_id == room_id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                return purged
+            db.execute(delete(MESSAGES).where(MESSAGES.c.id.in_(ids)))
+            db.commit()
+            purged += len(ids)
+
+
+def set_pins(pins: dict):
+    """Apply {room_id: location}; a location of None (or the room's hash home) removes the pin."""
+    with SessionLocal() as db:
+        for room_id, location in pins.items():
+            if location is None or location == shard_router.home_shard(room_id):
+                db.execute(delete(ShardPlacement).where(ShardPlacement.room_id == room_id))
+                shard_router.placements.pop(room_id, None)
+            else:
+                db.merge(ShardPlacement(room_id=room_id, shard=location))
+                shard_router.placements[room_id] = location
+        db.commit()
+
+
+def move_rooms(moves, pins: dict, batch_size: int, settle_seconds: float):
+    """Run the copy / pin / settle / copy / purge sequence for (room_id, source, target) moves."""
+    for room_id, source, target in moves:
+        copied = copy_room(room_id, source, target, batch_size)
+        logger.info(f"Room {room_id}: copied {copied} messages {source} -> {target}")
+    set_pins(pins)
+    if moves and settle_seconds > 0:
+        logger.info(f"Pins written; waiting {settle_seconds:.1f}s for every process to reload them")
+        time.sleep(settle_seconds)
+    for room_id, source, target in moves:
+        late = copy_room(room_id, source, target, batch_size)
+        purged = purge_room(room_id, source, batch_size)
+        logger.info(f"Room {room_id}: moved to {target} ({late} late messages copied, {purged} removed from {source})")
+
+
+def stray_moves():
+    """(room_id, location, route) for every room with messages somewhere it does not route to."""
+    moves = []
+    for location in shard_router.locations:
+        with _session(location) as db:
+            room_ids = db.execute(select(MESSAGES.c.room_id).distinct()).scalars().all()
+        moves.extend(
+            (room_id, location, shard_router.shard_for_room(room_id))
+            for room_id in room_ids
+            if room_id is not None and shard_router.shard_for_room(room_id) != location
+        )
+    return moves
+
+
+def status():
+    for location in shard_router.locations:
+        with _session(location) as db:
+            messages, rooms = db.execute(select(func.count(), func.count(MESSAGES.c.room_id.distinct())).select_from(MESSAGES)).one()
+        print(f"{location:>12}: {messages} messages in {rooms} rooms")
+    print(f"{len(shard_router.placements)} pinned rooms, {len(stray_moves())} rooms with stray messages")
+
+
+def pin_all(batch_size: int):
+    """Pin every room to where it routes now, so a changed shard map does not move anything yet."""
+    pinned = 0
+    with SessionLocal() as db:
+        room_ids = db.execute(select(ChatRoom.id).where(ChatRoom.id.notin_(select(ShardPlacement.room_id)))).scalars().all()
+        for batch in _batched(room_ids, batch_size):
+            db.execute(insert(ShardPlacement), [
+                {"room_id": room_id, "shard": shard_router.shard_for_room(room_id)} for room_id in batch
+            ])
+            pinned += len(batch)
+        db.commit()
+    logger.info(f"Pinned {pinned} rooms to their current shard")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move room messages between shards")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Messages per copy/delete batch")
+    parser.add_argument("--settle-seconds", type=float, default=settings.SHARD_PLACEMENT_REFRESH_SECONDS * 2,
+                        help="Wait after writing pins before the final copy and purge")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="Messages per shard, pins and stray rooms")
+    mover = commands.add_parser("move", help="Move one room and pin it to the target")
+    mover.add_argument("--room", type=int, required=True)
+    mover.add_argument("--to", required=True, help="Shard name (or 'primary')")
+    commands.add_parser("pin-all", help="Pin every room where it currently routes")
+    rebalancer = commands.add_parser("rebalance", help="Move pinned rooms to their hash shard, clear pins, sweep strays")
+    for command in (mover, rebalancer):
+        command.add_argument("--dry-run", action="store_true", help="Print the planned moves without changing anything")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    shard_router.create_tables()
+    with SessionLocal() as db:
+        shard_router.load_placements(db)
+
+    if args.command == "status":
+        status()
+        return
+    if args.command == "pin-all":
+        pin_all(args.batch_size)
+        return
+
+    if args.command == "move":
+        if args.to not in shard_router.locations:
+            parser.error(f"Unknown shard {args.to!r}; configured: {', '.join(shard_router.locations)}")
+        source = shard_router.shard_for_room(args.room)
+        moves = [(args.room, source, args.to)] if source != args.to else []
+        pins = {args.room: args.to}
+    else:
+        moves = [
+            (room_id, location, shard_router.home_shard(room_id))
+            for room_id, location in shard_router.placements.items()
+            if location != shard_router.home_shard(room_id)
+        ]
+        pins = {room_id: None for room_id in shard_router.placements}
+
+    for room_id, source, target in moves:
+        print(f"room {room_id}: {source} -> {target}")
+    if args.dry_run:
+        print(f"{len(moves)} moves, {len(pins)} pin changes (dry run)")
+        return
+    move_rooms(moves, pins, args.batch_size, args.settle_seconds)
+
+    # Whatever is left outside its route was written before a pin or map change took effect;
+    # nothing routes there any more, so no settle is needed
+    strays = stray_moves()
+    for room_id, source, target in strays:
+        copy_room(room_id, source, target, args.batch_size)
+        purge_room(room_id, source, args.batch_size)
+    if strays:
+        logger.info(f"Swept stray messages of {len(strays)} rooms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# app/utils/admission.py
+from typing import Dict, Optional
+import asyncio
+from app.config import settings
+from app.utils.logger import logger
+
+# Liveness probes must keep answering while the process sheds load
+EXEMPT_PATHS = {"/health"}
+
+# Close code for rejected upgrades (RFC 6455: Try Again Later)
+WS_TRY_AGAIN_LATER = 1013
+
+
+class AdmissionController:
+    """Decides whether this process can take on new work.
+
+    Overload is judged from event-loop lag (sampled by run_lag_monitor) and from in-flight
+    REST requests. New WebSocket upgrades are additionally capped per process and per room.
+    Work that is already admitted is never cut off; callers use `degraded` to defer
+    optional work (presence fan-out) instead.
+    """
+
+    def __init__(self):
+        self.loop_lag = 0.0  # seconds, exponentially weighted
+        self.inflight_requests = 0
+        self.connections = 0
+        self.room_connections: Dict[int, int] = {}
+        # Set once shutdown begins: no new WebSocket upgrades, optional work deferred
+        self.draining = False
+
+    @property
+    def degraded(self) -> bool:
+        return self.loop_lag * 1000 > settings.ADMISSION_MAX_LOOP_LAG_MS
+
+    def overload_reason(self) -> Optional[str]:
+        if self.degraded:
+            return f"event loop lag {self.loop_lag * 1000:.0f}ms"
+        if self.inflight_requests >= settings.ADMISSION_MAX_INFLIGHT_REQUESTS:
+            return f"{self.inflight_requests} requests in flight"
+        return None
+
+    def admit_websocket(self, room_id: int) -> Optional[str]:
+        """Reserve a connection slot; returns a rejection reason instead when over budget."""
+        reason = "worker is shutting down" if self.draining else self.overload_reason()
+        if reason is None and self.connections >= settings.ADMISSION_MAX_CONNECTIONS:
+            reason = f"{self.connections} connections on this worker"
+        if reason is None and self.room_connections.get(room_id, 0) >= settings.ADMISSION_MAX_ROOM_CONNECTIONS:
+            reason = f"room {room_id} is full"
+        if reason:
+            logger.warning(f"Rejecting WebSocket upgrade for room {room_id}: {reason}")
+            return reason
+        self.connections += 1
+        self.room_connections[room_id] = self.room_connections.get(room_id, 0) + 1
+        return None
+
+    def release_websocket(self, room_id: int):
+        self.connections -= 1
+        remaining = self.room_connections.get(room_id, 0) - 1
+        if remaining > 0:
+            self.room_connections[room_id] = remaining
+        else:
+            self.room_connections.pop(room_id, None)
+
+    async def run_lag_monitor(self, interval: float = 0.1):
+        """Sample how late the loop wakes up, smoothed so one slow callback does not trip shedding."""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(loop.time() - started - interval, 0.0)
+            self.loop_lag = 0.7 * self.loop_lag + 0.3 * lag
+
+
+class AdmissionMiddleware:
+    """ASGI middleware answering 503 + Retry-After to REST calls while the process is overloaded."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        reason = self.controller.overload_reason()
+        if reason:
+            logger.warning(f"Shedding {scope['method']} {scope['path']}: {reason}")
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(settings.ADMISSION_RETRY_AFTER_SECONDS).encode()),
+                ],
+            })
+            await send({
+                "type": "http.response.body",
+                "body": b'{"success":false,"message":"Server is overloaded, retry later","data":{}}',
+            })
+            return
+
+        self.controller.inflight_requests += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.inflight_requests -= 1
+
+
+# Initialize admission controller (singleton instance)
+admission = AdmissionController()
@@ -0,0 +1,172 @@
+# app/utils/conditional.py
+from collections import OrderedDict
+from hashlib import blake2b
+from itertools import count
+from typing import Dict, List, Tuple
+import asyncio
+import re
+import time
+import jwt
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import select
+from app.config import settings
+from app.db.session import SessionLocal
+from app.models.room_summary import RoomSummary
+from app.utils.ids import min_id_at
+from app.utils.logger import logger
+
+# Room resources answered from memory when the client's ETag is still current
+CONDITIONAL_PATH = re.compile(r"^/api/chat/rooms/(\d+)(?:/users|/messages)?$")
+# Polls re-read this far back so messages committed a little after their ID was generated are not missed
+POLL_OVERLAP_SECONDS = 5
+
+
+def _request_key(user_id: int, path: str, query_string: bytes) -> Tuple[int, str]:
+    return user_id, (f"{path}?{query_string.decode('latin-1')}" if query_string else path)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison (RFC 9110): W/ prefixes are ignored, "*" matches any current representation
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class RoomVersions:
+    """Per-room change counters, and the ETags of room responses validated against them.
+
+    A room's version moves whenever something in its responses may have changed: membership
+    (add_user_to_room/remove_user_from_room), new or deleted messages, room deletion and
+    online status. Versions come from one process-wide sequence, so setting one is a single
+    dict write and never goes backwards.
+
+    ETags are a digest of the response body. Each one is remembered per (user, URL) together
+    with the room version it was computed at. While that version is still current (and the
+    entry is younger than ETAG_MAX_AGE_SECONDS), ConditionalGetMiddleware answers a matching
+    If-None-Match with 304 straight from this table: no session, no query, no serialization.
+    Versions only see this process's writes directly; messages posted through other processes
+    are picked up by run_refresher (one indexed range scan on room_summaries.last_activity_id
+    per ROOM_VERSION_REFRESH_SECONDS), and any other remote change by the max age. Because
+    ETags are content digests, a full response always carries the right one either way.
+    """
+
+    def __init__(self, max_age_seconds: float, max_entries: int):
+        self.max_age_seconds = max_age_seconds
+        self.max_entries = max_entries
+        self._sequence = count(1)
+        self._versions: Dict[int, int] = {}
+        # _etags[(user_id, url)] = (etag, room_id, room version, monotonic time validated)
+        self._etags: "OrderedDict[Tuple[int, str], Tuple[str, int, int, float]]" = OrderedDict()
+
+    def version(self, room_id: int) -> int:
+        return self._versions.get(room_id, 0)
+
+    def bump(self, room_id: int):
+        self._versions[room_id] = next(self._sequence)
+
+    def bump_many(self, room_ids):
+        for room_id in room_ids:
+            self._versions[room_id] = next(self._sequence)
+
+    def current_etag(self, key: Tuple[int, str], room_id: int):
+        entry = self._etags.get(key)
+        if entry is None:
+            return None
+        etag, entry_room_id, version, validated_at = entry
+        if entry_room_id != room_id or version != self.version(room_id) or time.monotonic() - validated_at > self.max_age_seconds:
+            return None
+        return etag
+
+    def remember(self, key: Tuple[int, str], room_id: int, version: int, etag: str):
+        self._etags[key] = (etag, room_id, version, time.monotonic())
+        self._etags.move_to_end(key)
+        while len(self._etags) > self.max_entries:
+            self._etags.popitem(last=False)
+
+    def forget_user(self, user_id: int):
+        """Drop a user's remembered ETags, e.g. when the account is deleted."""
+        for key in [key for key in self._etags if key[0] == user_id]:
+            del self._etags[key]
+
+    def conditional_response(self, request: Request, user_id: int, room_id: int, version: int, response: Response) -> Response:
+        """Tag a 200 room response with its ETag; 304 if the client already has it.
+
+        Pass the room version read before the response's queries, so a change committed in
+        between leaves the remembered ETag stale rather than wrongly current.
+        """
+        etag = f'"{blake2b(response.body, digest_size=16).hexdigest()}"'
+        self.remember(_request_key(user_id, request.url.path, request.scope.get("query_string", b"")), room_id, version, etag)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return response
+
+    def _recent_activity(self, since: float) -> List[int]:
+        db = SessionLocal()
+        try:
+            return db.execute(
+                select(RoomSummary.room_id).where(RoomSummary.last_activity_id >= min_id_at(since))
+            ).scalars().all()
+        finally:
+            db.close()
+
+    async def run_refresher(self, interval: float):
+        """Bump rooms with messages posted through other processes."""
+        polled_at = time.time()
+        while True:
+            await asyncio.sleep(interval)
+            started = time.time()
+            try:
+                room_ids = await asyncio.to_thread(self._recent_activity, polled_at - POLL_OVERLAP_SECONDS)
+            except Exception as e:
+                logger.error(f"Error polling room activity: {str(e)}")
+                continue
+            self.bump_many(room_ids)
+            polled_at = started
+
+
+class ConditionalGetMiddleware:
+    """ASGI middleware answering If-None-Match on room GETs with 304 from RoomVersions.
+
+    Only the access token's signature and expiry are checked here. That is enough because an
+    ETag is remembered per user and only after that user passed the endpoint's membership
+    check, and leaving the room bumps the version. Everything else falls through to the app.
+    """
+
+    def __init__(self, app, versions: RoomVersions):
+        self.app = app
+        self.versions = versions
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "GET":
+            etag = self._current_etag(scope)
+            if etag is not None:
+                await send({"type": "http.response.start", "status": 304, "headers": [(b"etag", etag.encode())]})
+                await send({"type": "http.response.body", "body": b""})
+                return
+        await self.app(scope, receive, send)
+
+    def _current_etag(self, scope):
+        match = CONDITIONAL_PATH.match(scope["path"])
+        if not match:
+            return None
+        headers = dict(scope["headers"])
+        if_none_match = headers.get(b"if-none-match")
+        authorization = headers.get(b"authorization", b"")
+        if not if_none_match or not authorization.lower().startswith(b"bearer "):
+            return None
+        try:
+            payload = jwt.decode(authorization[7:].decode(), settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            user_id = int(payload["sub"])
+        except (jwt.PyJWTError, KeyError, ValueError, UnicodeError):
+            return None  # Let the endpoint reject it
+        key = _request_key(user_id, scope["path"], scope.get("query_string", b""))
+        etag = self.versions.current_etag(key, int(match.group(1)))
+        if etag is None or not _etag_matches(if_none_match.decode("latin-1"), etag):
+            return None
+        return etag
+
+
+# Initialize room versions (singleton instance)
+room_versions = RoomVersions(max_age_seconds=settings.ETAG_MAX_AGE_SECONDS, max_entries=settings.ETAG_CACHE_ENTRIES)
@@ -0,0 +1,87 @@
+# app/utils/deletion_worker.py
+import asyncio
+from contextlib import suppress
+from app.config import settings
+from app.crud.deletion import (
+    claim_deletion_job, get_deletion_job, get_resumable_job_ids, record_deletion_error, run_deletion_chunk
+)
+from app.db.session import SessionLocal
+from app.utils.logger import logger
+
+
+class DeletionWorker:
+    """Drives deletion jobs in bounded chunks with a pause between chunks.
+
+    Each chunk runs in a worker thread with its own short transaction, so neither the event
+    loop nor the messages table is held for long. Jobs are claimed under a lease that every
+    chunk renews; a job whose worker died is picked up again once its lease expires.
+    """
+
+    def __init__(self):
+        self._wake = asyncio.Event()
+
+    def wake(self):
+        """Start on newly created jobs now instead of at the next poll."""
+        self._wake.set()
+
+    def _resumable_job_ids(self):
+        db = SessionLocal()
+        try:
+            return get_resumable_job_ids(db, settings.DELETION_LEASE_SECONDS)
+        finally:
+            db.close()
+
+    def _claim(self, job_id: int) -> bool:
+        db = SessionLocal()
+        try:
+            return claim_deletion_job(db, job_id, settings.DELETION_LEASE_SECONDS)
+        finally:
+            db.close()
+
+    def _run_chunk(self, job_id: int) -> bool:
+        db = SessionLocal()
+        try:
+            job = get_deletion_job(db, job_id)
+            if job is None or job.status == "done":
+                return True
+            return run_deletion_chunk(db, job, settings.DELETION_BATCH_SIZE)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _record_error(self, job_id: int, error: str):
+        db = SessionLocal()
+        try:
+            record_deletion_error(db, job_id, error)
+        finally:
+            db.close()
+
+    async def run_job(self, job_id: int):
+        if not await asyncio.to_thread(self._claim, job_id):
+            return
+        logger.info(f"Running deletion job {job_id}")
+        try:
+            while not await asyncio.to_thread(self._run_chunk, job_id):
+                await asyncio.sleep(settings.DELETION_THROTTLE_SECONDS)
+        except Exception as e:
+            # Left in "running"; it is retried once the lease expires
+            logger.error(f"Deletion job {job_id} failed: {str(e)}")
+            await asyncio.to_thread(self._record_error, job_id, str(e))
+
+    async def run(self, poll_interval: float):
+        """Process pending and abandoned jobs until cancelled."""
+        while True:
+            self._wake.clear()
+            try:
+                for job_id in await asyncio.to_thread(self._resumable_job_ids):
+                    await self.run_job(job_id)
+            except Exception as e:
+                logger.error(f"Error polling deletion jobs: {str(e)}")
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), poll_interval)
+
+
+# Initialize deletion worker (singleton instance)
+deletion_worker = DeletionWorker()
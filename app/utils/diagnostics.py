@@ -0,0 +1,149 @@
+# app/utils/diagnostics.py
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from app.config import settings
+from app.utils.logger import logger
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> List[str]:
+    """Root-first list of frame labels for one thread's stack."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class Diagnostics:
+    """Opt-in event-loop stall detector and sampling profiler.
+
+    A heartbeat task on the event loop stamps the time every few milliseconds. A watchdog
+    thread notices when the stamp goes stale for longer than the slow-callback threshold
+    and captures the loop thread's stack while it is still blocked, which points at the
+    offending sync call. A second thread samples every thread's stack at a fixed interval
+    and aggregates them into flamegraph-compatible collapsed stacks.
+    """
+
+    def __init__(self, slow_callback_ms: float, sample_interval_ms: float, max_stalls: int = 50):
+        self.slow_callback = slow_callback_ms / 1000
+        self.sample_interval = sample_interval_ms / 1000
+        self.stalls: deque = deque(maxlen=max_stalls)
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.started_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat is not None
+
+    def start(self):
+        """Start monitoring the running event loop (call from inside the loop)."""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self.started_at = datetime.utcnow()
+        self._heartbeat = asyncio.get_running_loop().create_task(self._beat())
+        self._threads = [
+            threading.Thread(target=self._watchdog, name="diagnostics-watchdog", daemon=True),
+            threading.Thread(target=self._sampler, name="diagnostics-sampler", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Diagnostics started (stall threshold {self.slow_callback * 1000:.0f}ms, sampling every {self.sample_interval * 1000:.0f}ms)")
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._heartbeat.cancel()
+        try:
+            await self._heartbeat
+        except asyncio.CancelledError:
+            pass
+        self._heartbeat = None
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads = []
+
+    async def _beat(self):
+        interval = self.slow_callback / 4
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(interval)
+
+    def _watchdog(self):
+        interval = self.slow_callback / 4
+        current_stall = None
+        while not self._stop.wait(interval):
+            stalled_for = time.monotonic() - self._last_beat - interval
+            if stalled_for < self.slow_callback:
+                current_stall = None
+                continue
+            if current_stall is None:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                current_stall = {
+                    "detected_at": datetime.utcnow().isoformat(),
+                    "duration_ms": 0,
+                    "stack": traceback.format_stack(frame) if frame else [],
+                }
+                self.stalls.append(current_stall)
+                location = current_stall["stack"][-1].strip() if current_stall["stack"] else "unknown"
+                logger.warning(f"Event loop blocked for over {self.slow_callback * 1000:.0f}ms at: {location}")
+            current_stall["duration_ms"] = round(stalled_for * 1000)
+
+    def _sampler(self):
+        own = {thread.ident for thread in self._threads}
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.sample_interval):
+            frames = sys._current_frames()
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for thread_id, frame in frames.items():
+                if thread_id in own:
+                    continue
+                thread_name = "event-loop" if thread_id == self._loop_thread_id else names.get(thread_id, str(thread_id))
+                stacks.append(";".join([thread_name] + _collapse(frame)))
+            with self._lock:
+                self.samples.update(stacks)
+                self.sample_count += 1
+
+    def collapsed_stacks(self, reset: bool = False) -> str:
+        """Aggregated samples in collapsed format ("frame;frame;frame count" per line)."""
+        with self._lock:
+            lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+            if reset:
+                self.samples.clear()
+                self.sample_count = 0
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def stall_reports(self) -> List[dict]:
+        return list(self.stalls)
+
+
+# Initialize diagnostics (singleton instance; started only when DIAGNOSTICS_ENABLED)
+diagnostics = Diagnostics(
+    slow_callback_ms=settings.DIAGNOSTICS_SLOW_CALLBACK_MS,
+    sample_interval_ms=settings.DIAGNOSTICS_SAMPLE_INTERVAL_MS
+)
@@ -0,0 +1,113 @@
+# app/utils/ids.py
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import BigInteger, Integer
+
+# 64-bit k-sortable IDs: | 41 bits ms since EPOCH | 10 bits worker | 12 bits sequence |
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+TIMESTAMP_SHIFT = WORKER_BITS + SEQUENCE_BITS
+
+# Column type for primary/foreign keys holding generated IDs. SQLite keeps INTEGER so the
+# primary key stays a rowid alias (SQLite INTEGER is already 64-bit).
+IdType = BigInteger().with_variant(Integer, "sqlite")
+
+
+class WorkerSlotError(RuntimeError):
+    """No unique worker slot is held, so IDs cannot be issued safely."""
+
+
+class IdGenerator:
+    """Issues IDs for one worker slot.
+
+    A fixed `worker_id` is only for IDs that never leave the process (benchmarks). The
+    shared generator gets its slot from a lease claimed at process start (see
+    app/utils/worker_slots.py) and stops issuing IDs if the lease runs out or the process
+    forks, since another process may then hold the same slot.
+    """
+
+    def __init__(self, worker_id: int = None):
+        if worker_id is not None and not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}")
+        self._fixed = worker_id is not None
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._worker_id = worker_id
+        self._valid_until = None  # Monotonic deadline of the lease; None for a fixed slot
+        self._last_ms = -1
+        self._sequence = 0
+
+    @property
+    def worker_id(self) -> int:
+        return self._worker_id
+
+    def assign(self, worker_id: int, valid_for_seconds: float):
+        """Use a leased slot, valid for `valid_for_seconds` unless extended."""
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}")
+        with self._lock:
+            if worker_id != self._worker_id:
+                self._last_ms = -1
+                self._sequence = 0
+            self._pid = os.getpid()
+            self._worker_id = worker_id
+            self._valid_until = time.monotonic() + valid_for_seconds
+
+    def extend(self, valid_for_seconds: float):
+        with self._lock:
+            self._valid_until = time.monotonic() + valid_for_seconds
+
+    def revoke(self):
+        with self._lock:
+            self._worker_id = None
+            self._valid_until = None
+
+    def _check_slot(self):
+        if os.getpid() != self._pid and not self._fixed:
+            # Forked after claiming: the parent still holds this slot
+            self._pid = os.getpid()
+            self._worker_id = None
+            self._valid_until = None
+        if self._worker_id is None:
+            raise WorkerSlotError("No worker slot claimed in this process; claim one with worker_slot_lease.claim() at startup")
+        if self._valid_until is not None and time.monotonic() > self._valid_until:
+            raise WorkerSlotError(f"Lease on worker slot {self._worker_id} expired")
+
+    def next_id(self) -> int:
+        with self._lock:
+            self._check_slot()
+            now_ms = int(time.time() * 1000) - EPOCH_MS
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                # Same millisecond, or the wall clock stepped backwards: keep issuing from the
+                # last timestamp and borrow the next millisecond when the sequence runs out.
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return (self._last_ms << TIMESTAMP_SHIFT) | (self._worker_id << SEQUENCE_BITS) | self._sequence
+
+
+def id_to_datetime(generated_id: int) -> datetime:
+    """Creation time encoded in a generated ID (UTC)."""
+    return datetime.utcfromtimestamp(((generated_id >> TIMESTAMP_SHIFT) + EPOCH_MS) / 1000)
+
+
+def min_id_at(timestamp: float) -> int:
+    """Smallest ID generated at or after a Unix timestamp, for time-bounded range scans."""
+    return max(int(timestamp * 1000) - EPOCH_MS, 0) << TIMESTAMP_SHIFT
+
+
+# Initialize ID generator (singleton instance); its slot is claimed at process start
+id_generator = IdGenerator()
+
+
+def next_id() -> int:
+    return id_generator.next_id()
@@ -0,0 +1,197 @@
+# app/utils/query_budget.py
+"""SQL statement counting and timing per request / per WebSocket frame.
+
+Engine-level SQLAlchemy events attribute every statement to the QueryStats bound to the
+current context (see `track_queries`). QueryBudgetMiddleware wraps each REST call, the
+WebSocket handler wraps each frame, and the aggregated numbers are compared against
+QUERY_BUDGETS in `budget_report()`.
+
+In tests:
+
+    with assert_query_budget(3):
+        client.get(f"/api/chat/rooms/{room_id}", headers=headers)
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.utils.logger import logger
+
+# Maximum statements per call, keyed by "METHOD route-template" (or a WebSocket frame label).
+# Budgets ratchet: lower them as N+1 patterns are removed, never raise them to hide one.
+QUERY_BUDGETS: Dict[str, int] = {
+    "POST /api/register": 4,
+    "POST /api/login": 2,
+    "DELETE /api/delete": 4,
+    "GET /api/chat/rooms": 3,
+    "POST /api/chat/rooms": 9,
+    "GET /api/chat/rooms/{room_id}": 4,
+    "DELETE /api/chat/rooms/{room_id}": 5,
+    "POST /api/chat/rooms/{room_id}/join": 9,
+    "POST /api/chat/rooms/{room_id}/leave": 9,
+    "POST /api/chat/rooms/{room_id}/ticket": 3,
+    "GET /api/chat/rooms/{room_id}/users": 4,
+    "GET /api/chat/rooms/{room_id}/messages": 4,
+    "GET /api/chat/rooms/{room_id}/export": 4,
+    "POST /api/chat/messages": 5,
+    "GET /api/chat/inbox": 2,
+    "GET /api/chat/directory": 1,
+    "GET /api/chat/unread": 3,
+    "GET /api/chat/deletions/{job_id}": 2,
+    "WS /ws/chat/{room_id} connect": 4,
+    "WS /ws/chat/{room_id} message": 3,
+    "WS /ws/chat/{room_id} read": 0,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@dataclass
+class QueryStats:
+    label: str
+    count: int = 0
+    duration: float = 0.0
+    statements: List[str] = field(default_factory=list)
+
+
+@dataclass
+class EndpointStats:
+    calls: int = 0
+    queries: int = 0
+    max_queries: int = 0
+    duration: float = 0.0
+    over_budget: int = 0
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+_registry: Dict[str, EndpointStats] = {}
+_registry_lock = threading.Lock()
+_installed = False
+# Process-wide collectors used by assert_query_budget; test clients run the app in another
+# thread, where the caller's context variables are not visible
+_observers: List[QueryStats] = []
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None or _observers:
+        conn.info["query_budget_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None and not _observers:
+        return
+    elapsed = time.perf_counter() - conn.info.pop("query_budget_started", time.perf_counter())
+    for collector in ([stats] if stats is not None else []) + _observers:
+        collector.count += 1
+        collector.duration += elapsed
+        collector.statements.append(statement)
+
+
+def install():
+    """Attach the statement listeners to every Engine (idempotent)."""
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _installed = True
+
+
+def record(stats: QueryStats):
+    if not _installed:
+        return
+    budget = QUERY_BUDGETS.get(stats.label)
+    with _registry_lock:
+        entry = _registry.setdefault(stats.label, EndpointStats())
+        entry.calls += 1
+        entry.queries += stats.count
+        entry.max_queries = max(entry.max_queries, stats.count)
+        entry.duration += stats.duration
+        if budget is not None and stats.count > budget:
+            entry.over_budget += 1
+    if budget is not None and stats.count > budget:
+        logger.warning(f"Query budget exceeded for {stats.label}: {stats.count} statements (budget {budget})")
+
+
+@contextmanager
+def track_queries(label: str, record_stats: bool = True):
+    """Count statements issued in this context (including worker threads it spawns)."""
+    stats = QueryStats(label)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        if record_stats:
+            record(stats)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, label: str = "assertion"):
+    """Fail if more than `max_queries` statements run anywhere in the process inside the block."""
+    install()
+    stats = QueryStats(label)
+    _observers.append(stats)
+    try:
+        yield stats
+    finally:
+        _observers.remove(stats)
+    if stats.count > max_queries:
+        listing = "\n".join(f"  {i + 1}. {statement}" for i, statement in enumerate(stats.statements))
+        raise QueryBudgetExceeded(f"{stats.count} statements issued, budget {max_queries}:\n{listing}")
+
+
+def budget_report() -> List[dict]:
+    """Per-endpoint statistics, over-budget endpoints first."""
+    with _registry_lock:
+        items = list(_registry.items())
+    rows = []
+    for label, entry in items:
+        budget = QUERY_BUDGETS.get(label)
+        rows.append({
+            "endpoint": label,
+            "budget": budget,
+            "calls": entry.calls,
+            "avg_queries": round(entry.queries / entry.calls, 2),
+            "max_queries": entry.max_queries,
+            "avg_query_ms": round(entry.duration / entry.calls * 1000, 3),
+            "over_budget_calls": entry.over_budget,
+        })
+    rows.sort(key=lambda row: (-row["over_budget_calls"], row["endpoint"]))
+    return rows
+
+
+def reset_stats():
+    with _registry_lock:
+        _registry.clear()
+
+
+def _route_template(scope) -> str:
+    """Rebuild the route template ("/api/chat/rooms/{room_id}") from the matched path params."""
+    if "endpoint" not in scope:
+        return "<unmatched>"  # 404s share one bucket instead of one per raw path
+    params = {str(value): name for name, value in scope.get("path_params", {}).items()}
+    return "/".join(f"{{{params[segment]}}}" if segment in params else segment for segment in scope["path"].split("/"))
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware attributing each REST call's statements to its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with track_queries(scope["path"], record_stats=False) as stats:
+            await self.app(scope, receive, send)
+        stats.label = f"{scope['method']} {_route_template(scope)}"
+        record(stats)
@@ -0,0 +1,276 @@
+# app/utils/room_directory.py
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import base64
+import threading
+import time
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.db.session import SessionLocal
+from app.models.deletion_job import DeletionJob
+from app.models.room import ChatRoom
+from app.models.room_summary import RoomSummary
+from app.utils.ids import min_id_at
+from app.utils.logger import logger
+
+GRAM = 3  # Substring queries need at least this many characters
+# Polls re-read this far back so rooms committed a little after their ID was generated are not missed
+POLL_OVERLAP_SECONDS = 30
+
+
+def _key(name: Optional[str]) -> str:
+    return (name or "").casefold()
+
+
+def _grams(key: str):
+    return {key[i:i + GRAM] for i in range(len(key) - GRAM + 1)}
+
+
+def encode_cursor(key: str, room_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{room_id}:{key}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """(key, room_id) of the last room on the previous page; ValueError if malformed."""
+    try:
+        room_id, _, key = base64.urlsafe_b64decode(cursor.encode()).decode().partition(":")
+        return key, int(room_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+class _Index:
+    def __init__(self):
+        self.entries: List[Tuple[str, int]] = []  # (casefolded name, room ID), sorted
+        self.keys: Dict[int, str] = {}
+        self.names: Dict[int, str] = {}
+        self.members: Dict[int, int] = {}
+        # grams[trigram] = IDs of rooms whose name contains it; removed rooms stay until compaction
+        self.grams: Dict[str, List[int]] = {}
+        self.dead = 0
+
+    @classmethod
+    def build(cls, rows) -> "_Index":
+        index = cls()
+        for room_id, name, member_count in rows:
+            key = _key(name)
+            index.entries.append((key, room_id))
+            index.keys[room_id] = key
+            index.names[room_id] = name or ""
+            index.members[room_id] = member_count or 0
+        index.entries.sort()
+        index._index_grams()
+        return index
+
+    def _index_grams(self):
+        grams = defaultdict(list)
+        for room_id, key in self.keys.items():
+            for gram in {key[i:i + GRAM] for i in range(len(key) - GRAM + 1)}:
+                grams[gram].append(room_id)
+        self.grams = dict(grams)
+        self.dead = 0
+
+    def add(self, room_id: int, name: str, member_count: int):
+        if room_id in self.keys:
+            return
+        key = _key(name)
+        insort(self.entries, (key, room_id))
+        self.keys[room_id] = key
+        self.names[room_id] = name or ""
+        self.members[room_id] = member_count
+        for gram in _grams(key):
+            self.grams.setdefault(gram, []).append(room_id)
+
+    def remove(self, room_id: int):
+        key = self.keys.pop(room_id, None)
+        if key is None:
+            return
+        entry = (key, room_id)
+        del self.entries[bisect_left(self.entries, entry)]
+        del self.names[room_id]
+        del self.members[room_id]
+        self.dead += 1
+        if self.dead > max(len(self.keys) // 4, 1000):
+            self._index_grams()
+
+
+class RoomDirectory:
+    """In-memory index of live room names behind the room directory endpoint.
+
+    Rooms are kept in a list sorted by (casefolded name, ID), so a prefix search is a
+    bisect plus a slice. Substring search uses trigram posting lists: a query either checks
+    every room in its rarest trigram's list or, when that list is long (a common substring),
+    walks the sorted list and stops once the page is full, whichever touches fewer rooms.
+    Pages are ordered by name and continued with an opaque cursor.
+
+    create_chat_room/delete_chat_room and membership changes update the index as they
+    commit. Other processes' changes are picked up by the refresher: every
+    ROOM_DIRECTORY_REFRESH_SECONDS it reads rooms and room deletion jobs with recent
+    (time-ordered) IDs, two primary-key range scans; every ROOM_DIRECTORY_REBUILD_SECONDS
+    it rebuilds the whole index in a worker thread, which also corrects member counts.
+    Local changes made while a rebuild is loading are replayed before it is swapped in.
+    """
+
+    def __init__(self):
+        self._index = _Index()
+        self._lock = threading.Lock()
+        self._journal: Optional[list] = None  # Local changes made during a rebuild
+
+    def __len__(self) -> int:
+        return len(self._index.keys)
+
+    def room_created(self, room_id: int, name: str, member_count: int = 1):
+        with self._lock:
+            self._index.add(room_id, name, member_count)
+            if self._journal is not None:
+                self._journal.append((True, room_id, name, member_count))
+
+    def room_deleted(self, room_id: int):
+        with self._lock:
+            self._index.remove(room_id)
+            if self._journal is not None:
+                self._journal.append((False, room_id, None, 0))
+
+    def members_changed(self, room_id: int, delta: int):
+        # Not journaled: a rebuild racing a join may be off by one until the next rebuild
+        with self._lock:
+            members = self._index.members
+            if room_id in members:
+                members[room_id] = max(members[room_id] + delta, 0)
+
+    def search(self, query: str = "", substring: bool = False, limit: int = 20, cursor: str = None):
+        """(rooms, next_cursor); rooms are dicts with room_id, name and member_count.
+
+        Raises ValueError for a malformed cursor or a substring query under GRAM characters.
+        """
+        query = _key(query)
+        after = decode_cursor(cursor) if cursor else None
+        if substring and len(query) < GRAM:
+            raise ValueError(f"Substring search needs at least {GRAM} characters")
+
+        with self._lock:
+            index = self._index
+            if substring:
+                hits = self._substring(index, query, limit + 1, after)
+            else:
+                hits = self._prefix(index, query, limit + 1, after)
+            rooms = [
+                {"room_id": room_id, "name": index.names[room_id], "member_count": index.members[room_id]}
+                for _, room_id in hits[:limit]
+            ]
+        next_cursor = encode_cursor(*hits[limit - 1]) if len(hits) > limit else None
+        return rooms, next_cursor
+
+    @staticmethod
+    def _prefix(index: _Index, query: str, count: int, after) -> List[Tuple[str, int]]:
+        entries = index.entries
+        start = bisect_left(entries, (query,))
+        if after is not None:
+            start = max(start, bisect_right(entries, after))
+        hits = entries[start:start + count]
+        if hits and not hits[-1][0].startswith(query):
+            hits = [entry for entry in hits if entry[0].startswith(query)]
+        return hits
+
+    @staticmethod
+    def _substring(index: _Index, query: str, count: int, after) -> List[Tuple[str, int]]:
+        postings = [index.grams.get(gram) for gram in _grams(query)]
+        if not all(postings):
+            return []
+        rarest = min(postings, key=len)
+        entries = index.entries
+        start = bisect_right(entries, after) if after is not None else 0
+
+        # Walking the sorted list visits about count * rooms / len(rarest) entries to fill a page
+        if len(rarest) * len(rarest) < count * len(entries):
+            keys = index.keys
+            hits = set()
+            for room_id in rarest:
+                key = keys.get(room_id)
+                if key is not None and query in key:
+                    entry = (key, room_id)
+                    if after is None or entry > after:
+                        hits.add(entry)
+            return sorted(hits)[:count]
+
+        hits = []
+        for position in range(start, len(entries)):
+            entry = entries[position]
+            if query in entry[0]:
+                hits.append(entry)
+                if len(hits) == count:
+                    break
+        return hits
+
+    def load(self, db: Session):
+        """Rebuild the index from the database (live rooms with their member counts)."""
+        with self._lock:
+            self._journal = []
+        try:
+            index = _Index.build(db.execute(self._rooms_query()).all())
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            for created, room_id, name, member_count in self._journal:
+                if created:
+                    index.add(room_id, name, member_count)
+                else:
+                    index.remove(room_id)
+            self._index = index
+            self._journal = None
+        logger.info(f"Room directory loaded: {len(index.keys)} rooms")
+
+    def apply_recent(self, db: Session, since: float):
+        """Apply rooms created or deleted (by any process) since a Unix timestamp."""
+        since_id = min_id_at(since)
+        created = db.execute(self._rooms_query().where(ChatRoom.id >= since_id)).all()
+        deleted = db.execute(
+            select(DeletionJob.entity_id).where(DeletionJob.id >= since_id, DeletionJob.entity_type == "room")
+        ).scalars().all()
+        with self._lock:
+            for room_id, name, member_count in created:
+                self._index.add(room_id, name, member_count or 0)
+            for room_id in deleted:
+                self._index.remove(room_id)
+
+    @staticmethod
+    def _rooms_query():
+        return (
+            select(ChatRoom.id, ChatRoom.name, RoomSummary.member_count)
+            .outerjoin(RoomSummary, RoomSummary.room_id == ChatRoom.id)
+            .where(ChatRoom.deleted_at.is_(None))
+        )
+
+    def _refresh(self, rebuild: bool, since: float):
+        db = SessionLocal()
+        try:
+            if rebuild:
+                self.load(db)
+            else:
+                self.apply_recent(db, since)
+        finally:
+            db.close()
+
+    async def run_refresher(self, interval: float, rebuild_interval: float):
+        """Pick up rooms changed by other processes (call after load())."""
+        polled_at = rebuilt_at = time.time()
+        while True:
+            await asyncio.sleep(interval)
+            started = time.time()
+            rebuild = started - rebuilt_at >= rebuild_interval
+            try:
+                await asyncio.to_thread(self._refresh, rebuild, polled_at - POLL_OVERLAP_SECONDS)
+            except Exception as e:
+                logger.error(f"Error refreshing room directory: {str(e)}")
+                continue
+            polled_at = started
+            if rebuild:
+                rebuilt_at = started
+
+
+# Initialize room directory (singleton instance)
+room_directory = RoomDirectory()
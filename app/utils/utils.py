@@ -1,12 +1,73 @@
-from fastapi.responses import JSONResponse
+import json
+import zlib
+from datetime import datetime
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # Falls back to stdlib json
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_json(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available; also encodes datetimes."""
+
+    def render(self, content) -> bytes:
+        return dumps_json(content)
 
 
 def create_json_response(success: bool, message: str, data: dict = None, status_code: int = 200):
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status_code,
         content={
             "success": success,
             "message": message,
             "data": data or {}
         }
-    )
\ No newline at end of file
+    )
+
+
+def create_model_response(adapter, objects, status_code: int = 200):
+    """Validate ORM objects with a precompiled TypeAdapter and serialize them straight to JSON bytes."""
+    validated = adapter.validate_python(objects, from_attributes=True)
+    return Response(content=adapter.dump_json(validated), status_code=status_code, media_type="application/json")
+
+
+def create_rows_response(rows, status_code: int = 200):
+    """Serialize trusted DB rows directly, skipping model validation."""
+    return Response(content=dumps_json([row._asdict() for row in rows]), status_code=status_code, media_type="application/json")
+
+
+def encode_ndjson(batches, compress: bool = False):
+    """Encode batches of message rows as NDJSON lines, optionally gzip-compressed on the fly."""
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 -> gzip container
+    for rows in batches:
+        chunk = "".join(
+            json.dumps({
+                "id": row.id,
+                "text": row.text,
+                "sender_id": row.sender_id,
+                "room_id": row.room_id,
+                "created_at": row.created_at.isoformat() if row.created_at else None
+            }, separators=(",", ":")) + "\n"
+            for row in rows
+        ).encode("utf-8")
+        if compressor:
+            chunk = compressor.compress(chunk)
+            if not chunk:
+                continue
+        yield chunk
+    if compressor:
+        yield compressor.flush()
\ No newline at end of file
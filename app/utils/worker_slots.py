@@ -0,0 +1,108 @@
+# app/utils/worker_slots.py
+from typing import Optional
+import os
+import socket
+import threading
+import uuid
+from app.config import settings
+from app.crud.worker_slot import claim_worker_slot, release_worker_slot, renew_worker_slot
+from app.db.session import SessionLocal
+from app.utils.ids import IdGenerator, WorkerSlotError, id_generator
+from app.utils.logger import logger
+
+
+class WorkerSlotLease:
+    """Holds this process's ID worker slot: a row in id_worker_slots on the primary.
+
+    claim() runs once at process start (one select and one insert/update) and gives the slot
+    to the ID generator; a daemon thread renews the row every third of the lease. The
+    generator only trusts the slot for half the lease after each successful renewal, so it
+    stops issuing IDs well before another process could see the row as expired, even with
+    some clock skew between hosts. If the row was taken over anyway (the process stalled
+    past its lease), the slot is dropped and a new one claimed. A forked child inherits
+    neither the slot nor the renewal thread and must claim its own.
+    """
+
+    def __init__(self, generator: IdGenerator, lease_seconds: float, slot: Optional[int] = None):
+        self.generator = generator
+        self.lease_seconds = lease_seconds
+        self.requested_slot = slot  # Pinned slot (WORKER_ID), or None for any free one
+        self.slot: Optional[int] = None
+        self._owner = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        os.register_at_fork(after_in_child=self._forget)
+
+    def _forget(self):
+        self.slot = None
+        self._owner = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _claim(self) -> Optional[int]:
+        db = SessionLocal()
+        try:
+            return claim_worker_slot(db, self._owner, self.lease_seconds, self.requested_slot)
+        finally:
+            db.close()
+
+    def claim(self) -> int:
+        """Lease a slot for this process; raises WorkerSlotError if none can be obtained."""
+        if self.slot is not None:
+            return self.slot
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        slot = self._claim()
+        if slot is None:
+            wanted = f"worker slot {self.requested_slot} (WORKER_ID)" if self.requested_slot is not None else "a free worker slot"
+            raise WorkerSlotError(f"Could not lease {wanted}; refusing to generate IDs")
+        self.slot = slot
+        self.generator.assign(slot, self.lease_seconds / 2)
+        self._thread = threading.Thread(target=self._renew_loop, args=(self._stop,), name="worker-slot-lease", daemon=True)
+        self._thread.start()
+        logger.info(f"Leased ID worker slot {slot} as {self._owner}")
+        return slot
+
+    def _renew(self) -> bool:
+        db = SessionLocal()
+        try:
+            return renew_worker_slot(db, self.slot, self._owner, self.lease_seconds)
+        finally:
+            db.close()
+
+    def _renew_loop(self, stop: threading.Event):
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                if self.slot is None:
+                    slot = self._claim()
+                    if slot is not None:
+                        self.slot = slot
+                        self.generator.assign(slot, self.lease_seconds / 2)
+                        logger.info(f"Leased ID worker slot {slot} as {self._owner}")
+                elif self._renew():
+                    self.generator.extend(self.lease_seconds / 2)
+                else:
+                    logger.error(f"ID worker slot {self.slot} was taken over; claiming another")
+                    self.generator.revoke()
+                    self.slot = None
+            except Exception as e:
+                # The generator stops on its own once the renewed lease runs out
+                logger.error(f"Error renewing ID worker slot: {str(e)}")
+
+    def release(self):
+        """Stop renewing and free the slot (on shutdown)."""
+        if self.slot is None:
+            return
+        self._stop.set()
+        self.generator.revoke()
+        slot, self.slot = self.slot, None
+        db = SessionLocal()
+        try:
+            release_worker_slot(db, slot, self._owner)
+        except Exception as e:
+            logger.error(f"Error releasing ID worker slot {slot}: {str(e)}")  # It expires on its own
+        finally:
+            db.close()
+
+
+# Initialize worker slot lease (singleton instance)
+worker_slot_lease = WorkerSlotLease(id_generator, settings.WORKER_SLOT_LEASE_SECONDS, slot=settings.WORKER_ID)
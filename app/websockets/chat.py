@@ -6,85 +6,122 @@ from app.db.session import SessionLocal
 from app.models.user import User
 from app.models.room import ChatRoom
 from app.models.message import Message
+from app.crud.message import lock_room_and_sender, save_message
 from app.config import settings
 from app.websockets.connection import manager
+from app.websockets.read_state import read_state
+from app.websockets.tickets import room_tickets
 from app.utils.logger import logger
+from app.utils.query_budget import track_queries
 
-async def chat_websocket(websocket: WebSocket, room_id: int, token: str = None):
-    if not token:
-        await websocket.close(code=1008, reason="Missing authentication token")
-        return
-    
-    # Authenticate user from token
+def handle_read_frame(user_id: int, room_id: int, message_data: dict):
+    """Apply a {"type": "read", "message_id": ..., "cursors": {room_id: message_id}} frame."""
+    cursors = dict(message_data.get("cursors") or {})
+    if message_data.get("message_id") is not None:
+        cursors[room_id] = message_data["message_id"]
+    for cursor_room_id, message_id in cursors.items():
+        try:
+            read_state.mark_read(user_id, int(cursor_room_id), int(message_id))
+        except (TypeError, ValueError):
+            logger.debug(f"Ignoring malformed read cursor from user {user_id}: {cursor_room_id}={message_id}")
+
+def _authorize_token(token: str, room_id: int):
+    """Check an access token against the database: user, room and membership.
+
+    Uses its own short session, so no pooled connection stays checked out once the
+    handshake is decided. Returns ((user_id, username), None) on success, else
+    (None, close reason)."""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            await websocket.close(code=1008, reason="Invalid authentication token")
-            return
-        
-        # Get user and room from database
-        db = SessionLocal()
-        try:
-            user = db.query(User).filter(User.id == int(user_id)).first()
-            room = db.query(ChatRoom).filter(ChatRoom.id == room_id).first()
-            
-            if not user or not room:
-                await websocket.close(code=1008, reason="User or room not found")
-                return
-            
-            # Check if user is in the room
-            if user not in room.users:
-                await websocket.close(code=1008, reason="Access denied: You are not a member of this room")
-                return
-            
-            # Accept the connection and add to connection manager
-            await manager.connect(websocket, room_id, user.id)
-            
+    except jwt.PyJWTError:
+        logger.warning("WebSocket connection rejected: Invalid token")
+        return None, "Invalid authentication token"
+    user_id = payload.get("sub")
+    if not user_id:
+        return None, "Invalid authentication token"
+
+    with track_queries("WS /ws/chat/{room_id} connect"), SessionLocal() as db:
+        user = db.query(User).filter(User.id == int(user_id), User.deleted_at.is_(None)).first()
+        room = db.query(ChatRoom).filter(ChatRoom.id == room_id, ChatRoom.deleted_at.is_(None)).first()
+        if not user or not room:
+            return None, "User or room not found"
+        if user not in room.users:
+            return None, "Access denied: You are not a member of this room"
+        return (user.id, user.username), None
+
+async def chat_websocket(websocket: WebSocket, room_id: int, token: str = None, ticket: str = None):
+    # The database is only used in short units of work (the handshake, each message write),
+    # so idle sockets never hold a pooled connection
+    if ticket:
+        # Issued by the REST API after a membership check: no database access needed
+        identity = room_tickets.verify(ticket, room_id)
+        reason = None if identity else "Invalid, expired or revoked room ticket"
+    elif token:
+        identity, reason = _authorize_token(token, room_id)
+    else:
+        identity, reason = None, "Missing authentication token"
+    if reason:
+        await websocket.close(code=1008, reason=reason)
+        return
+    user_id, username = identity
+
+    # Accept the connection and add to connection manager
+    await manager.connect(websocket, room_id, user_id)
+
+    try:
+        while True:
+            # Receive and process messages
+            data = await websocket.receive_text()
             try:
-                while True:
-                    # Receive and process messages
-                    data = await websocket.receive_text()
-                    message_data = json.loads(data)
+                message_data = json.loads(data)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring malformed frame from user {username} in room {room_id}")
+                continue
+            if not isinstance(message_data, dict):
+                continue
+
+            # Read cursor updates are buffered and written in batches
+            if message_data.get("type") == "read":
+                with track_queries("WS /ws/chat/{room_id} read"):
+                    handle_read_frame(user_id, room_id, message_data)
+                continue
+
+            message_text = message_data.get("text")
 
-                    message_text = message_data.get("text")
-                    
-                    # Process message based on type
-                    if not message_text:
-                        continue
-                    # Create and save message to database
+            # Process message based on type
+            if not message_text:
+                continue
+            # Create and save message to database (the session is closed again before broadcasting)
+            with track_queries("WS /ws/chat/{room_id} message"), SessionLocal() as db:
+                # The room or account may have been deleted (possibly via another worker) since the handshake
+                allowed = lock_room_and_sender(db, room_id, user_id)
+                if allowed:
                     new_message = Message(
                         text=message_data.get("text"),
-                        sender_id=user.id,
+                        sender_id=user_id,
                         room_id=room_id,
                         created_at=datetime.utcnow()
                     )
-                    db.add(new_message)
-                    db.commit()
-                    db.refresh(new_message)
-                    
-                    # Broadcast message to all users in the room
-                    await manager.broadcast_message({
-                        "type": "new_message",
-                        "id": new_message.id,
-                        "text": new_message.text,
-                        "sender_id": new_message.sender_id,
-                        "sender_username": user.username,
-                        "room_id": new_message.room_id,
-                        "created_at": new_message.created_at.isoformat()
-                    }, room_id)
-                    
-                    
-                
-            except WebSocketDisconnect:
-                # Handle disconnection
-                manager.disconnect(websocket, room_id, user.id)
-                logger.info(f"User {user.username} disconnected from room {room.name}")
-            
-        finally:
-            db.close()
-    
-    except jwt.PyJWTError:
-        await websocket.close(code=1008, reason="Invalid authentication token")
-        logger.warning("WebSocket connection rejected: Invalid token")
-        return
\ No newline at end of file
+                    save_message(db, new_message)
+            if not allowed:
+                logger.warning(f"Rejected message from user {username} in room {room_id}: room or account deleted")
+                await manager.close(websocket, 1008, "Room or account deleted")
+                return
+            read_state.message_created(room_id, new_message.id, user_id)
+
+            # Broadcast message to all users in the room
+            await manager.broadcast_message({
+                "type": "new_message",
+                "id": new_message.id,
+                "text": new_message.text,
+                "sender_id": new_message.sender_id,
+                "sender_username": username,
+                "room_id": new_message.room_id,
+                "created_at": new_message.created_at.isoformat()
+            }, room_id)
+
+    except WebSocketDisconnect:
+        logger.info(f"User {username} disconnected from room {room_id}")
+    finally:
+        # Also on errors (e.g. a failed write), so the socket and its writer are never left registered
+        manager.disconnect(websocket, room_id, user_id)
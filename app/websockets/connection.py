@@ -1,13 +1,21 @@
 from fastapi import WebSocket
 from typing import Dict, List, Set
 from datetime import datetime
+from itertools import count
 import logging
 import asyncio
 import json
+from app.config import settings
+from app.utils.admission import WS_TRY_AGAIN_LATER
+from app.utils.conditional import room_versions
 
 # Configure logging
 logger = logging.getLogger("chat_app.websocket")
 
+# Outbound frame priorities: lower is sent first
+CHAT_PRIORITY = 0
+PRESENCE_PRIORITY = 1
+
 class ConnectionManager:
     def __init__(self):
         # active_connections[room_id] = list of websocket connections
@@ -16,71 +24,196 @@ class ConnectionManager:
         self.user_connections: Dict[int, List[WebSocket]] = {}
         # Set to track active users in each room
         self.active_users: Dict[int, Set[int]] = {}
-        
+        # outbound[websocket] = priority queue drained by that socket's writer task
+        self.outbound: Dict[WebSocket, asyncio.PriorityQueue] = {}
+        self.writers: Dict[WebSocket, asyncio.Task] = {}
+        # last_delivered[websocket] = ID of the newest chat message written to that socket
+        self.last_delivered: Dict[WebSocket, int] = {}
+        # presence_pending[room_id][user_id] = "joined" | "left", coalesced until the next flush
+        self.presence_pending: Dict[int, Dict[int, str]] = {}
+        # Tie-breaker that keeps frames of equal priority in FIFO order
+        self._sequence = count()
+        # Close tasks for sockets shed by _enqueue (held so they are not garbage collected)
+        self._closing: Set[asyncio.Task] = set()
+
     async def connect(self, websocket: WebSocket, room_id: int, user_id: int):
         await websocket.accept()
-        
+
         # Initialize room connections if not exists
         if room_id not in self.active_connections:
             self.active_connections[room_id] = []
             self.active_users[room_id] = set()
-            
+
         # Add connection to room
         self.active_connections[room_id].append(websocket)
-        
+
         # Add to user connections
         if user_id not in self.user_connections:
             self.user_connections[user_id] = []
         self.user_connections[user_id].append(websocket)
-        
-        # Add user to active users in this room
+
+        # Add user to active users in this room (online status is part of GET /rooms/{id}/users)
         self.active_users[room_id].add(user_id)
-        
+        room_versions.bump(room_id)
+
+        # Start the socket's writer
+        queue = asyncio.PriorityQueue()
+        self.outbound[websocket] = queue
+        self.writers[websocket] = asyncio.create_task(self._writer(websocket, queue))
+
         logger.info(f"User {user_id} connected to room {room_id}")
         logger.debug(f"Room {room_id} has {len(self.active_connections[room_id])} connections")
-        
-        # Announce user joined room
-        await self.broadcast_user_activity(room_id, user_id, action="joined")
-        
+
+        # Announce user joined room (batched into the next presence delta)
+        self.queue_user_activity(room_id, user_id, action="joined")
+
     def disconnect(self, websocket: WebSocket, room_id: int, user_id: int):
+        # Stop the socket's writer; anything still queued for it is undeliverable
+        writer = self.writers.pop(websocket, None)
+        if writer:
+            writer.cancel()
+        self.outbound.pop(websocket, None)
+        self.last_delivered.pop(websocket, None)
+
         # Remove from room connections
         if room_id in self.active_connections:
             if websocket in self.active_connections[room_id]:
                 self.active_connections[room_id].remove(websocket)
                 logger.info(f"User {user_id} disconnected from room {room_id}")
-        
+
         # Remove from user connections
         if user_id in self.user_connections:
             if websocket in self.user_connections[user_id]:
                 self.user_connections[user_id].remove(websocket)
                 if len(self.user_connections[user_id]) == 0:
                     del self.user_connections[user_id]
-                    
+
                     # Remove user from active users in this room
                     if room_id in self.active_users and user_id in self.active_users[room_id]:
                         self.active_users[room_id].remove(user_id)
-                    
-                    # Announce user left room
-                    asyncio.create_task(self.broadcast_user_activity(room_id, user_id, action="left"))
-    
+                        room_versions.bump(room_id)
+
+                    # Announce user left room (batched into the next presence delta)
+                    self.queue_user_activity(room_id, user_id, action="left")
+
+    async def _writer(self, websocket: WebSocket, queue: asyncio.PriorityQueue):
+        while True:
+            _, _, text, message_id = await queue.get()
+            try:
+                await websocket.send_text(text)
+                if message_id is not None:
+                    self.last_delivered[websocket] = message_id
+            except Exception as e:
+                logger.error(f"Error broadcasting message: {str(e)}")
+            finally:
+                queue.task_done()
+
+    async def wait_outbound_idle(self):
+        """Wait until every frame queued so far has been written to its socket."""
+        await asyncio.gather(*(queue.join() for queue in list(self.outbound.values())))
+
+    def connected_sockets(self) -> List[WebSocket]:
+        return [websocket for connections in self.active_connections.values() for websocket in connections]
+
+    async def close(self, websocket: WebSocket, code: int, reason: str) -> bool:
+        """Close a socket from the server side; its handler's disconnect cleans up the registries."""
+        writer = self.writers.pop(websocket, None)
+        if writer is None:
+            return False  # Already disconnected
+        writer.cancel()
+        try:
+            await websocket.close(code=code, reason=reason)
+        except Exception as e:
+            logger.debug(f"Error closing WebSocket: {str(e)}")
+        return True
+
+    async def close_room(self, room_id: int, reason: str):
+        """Close every socket in a room (1008), e.g. once the room is deleted."""
+        for websocket in list(self.active_connections.get(room_id, ())):
+            await self.close(websocket, 1008, reason)
+
+    async def close_user(self, user_id: int, reason: str):
+        """Close every socket of a user (1008), e.g. once the account is deleted."""
+        for websocket in list(self.user_connections.get(user_id, ())):
+            await self.close(websocket, 1008, reason)
+
+    def _enqueue(self, room_id: int, text: str, priority: int, message_id: int = None):
+        for connection in self.active_connections.get(room_id, ()):
+            queue = self.outbound.get(connection)
+            if queue is None:
+                continue
+            if queue.qsize() >= settings.WS_OUTBOUND_QUEUE_LIMIT:
+                if priority == PRESENCE_PRIORITY:
+                    # Presence is advisory: shed it for sockets that are already backed up
+                    logger.warning(f"Dropping presence frame for a backed-up socket in room {room_id}")
+                else:
+                    self._shed(connection, room_id)
+                continue
+            queue.put_nowait((priority, next(self._sequence), text, message_id))
+
+    def _shed(self, websocket: WebSocket, room_id: int):
+        """Close a socket whose client stopped reading chat frames, instead of queueing without
+        bound. The client reconnects and catches up from the message history."""
+        logger.warning(f"Closing a WebSocket in room {room_id}: {settings.WS_OUTBOUND_QUEUE_LIMIT} frames queued")
+        self.outbound.pop(websocket, None)  # Free the backlog now; nothing more is queued for it
+        task = asyncio.get_running_loop().create_task(
+            self.close(websocket, WS_TRY_AGAIN_LATER, "Too far behind, reconnect to catch up")
+        )
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
     async def broadcast_message(self, message: dict, room_id: int):
-        if room_id in self.active_connections:
-            for connection in self.active_connections[room_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error broadcasting message: {str(e)}")
-    
-    async def broadcast_user_activity(self, room_id: int, user_id: int, action: str):
-        """Broadcast user activity (joined/left) to all users in a room"""
-        message = {
-            "type": "user_activity",
-            "user_id": user_id,
-            "action": action,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        await self.broadcast_message(message, room_id)
-    
+        # Serialize once per broadcast (same encoding as WebSocket.send_json); chat frames
+        # jump ahead of any queued presence traffic
+        text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        self._enqueue(room_id, text, CHAT_PRIORITY, message.get("id"))
+
+    async def broadcast_messages(self, messages: List[dict], room_id: int):
+        """Fan out several new messages to a room as one coalesced "new_messages" frame."""
+        text = json.dumps({"type": "new_messages", "room_id": room_id, "messages": messages}, separators=(",", ":"), ensure_ascii=False)
+        self._enqueue(room_id, text, CHAT_PRIORITY, max(message["id"] for message in messages))
+
+    def queue_user_activity(self, room_id: int, user_id: int, action: str):
+        """Record a user activity (joined/left) for the room's next presence delta"""
+        pending = self.presence_pending.setdefault(room_id, {})
+        previous = pending.get(user_id)
+        if previous and previous != action:
+            # A join and a leave inside one window cancel out
+            del pending[user_id]
+            if not pending:
+                del self.presence_pending[room_id]
+        else:
+            pending[user_id] = action
+
+    def flush_presence(self):
+        """Send one coalesced presence delta per room with pending activity"""
+        pending, self.presence_pending = self.presence_pending, {}
+        timestamp = datetime.utcnow().isoformat()
+        for room_id, actions in pending.items():
+            message = {
+                "type": "presence_delta",
+                "room_id": room_id,
+                "joined": [user_id for user_id, action in actions.items() if action == "joined"],
+                "left": [user_id for user_id, action in actions.items() if action == "left"],
+                "timestamp": timestamp
+            }
+            self._enqueue(room_id, json.dumps(message, separators=(",", ":"), ensure_ascii=False), PRESENCE_PRIORITY)
+
+    async def run_presence_flusher(self, interval: float, defer=None):
+        """Flush presence deltas every `interval` seconds until cancelled.
+
+        While `defer()` returns True (e.g. the worker is overloaded) deltas keep coalescing
+        instead of being sent, so chat traffic gets the loop to itself.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            if defer is not None and defer():
+                continue
+            try:
+                self.flush_presence()
+            except Exception as e:
+                logger.error(f"Error flushing presence: {str(e)}")
+
     def get_active_users(self, room_id: int) -> List[int]:
         """Get list of active user IDs in a room"""
         if room_id in self.active_users:
@@ -88,4 +221,4 @@ class ConnectionManager:
         return []
 
 # Initialize connection manager (singleton instance)
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
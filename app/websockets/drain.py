@@ -0,0 +1,113 @@
+# app/websockets/drain.py
+from functools import partial
+from typing import Optional
+import asyncio
+import json
+import math
+import random
+import signal
+import threading
+from app.config import settings
+from app.utils.admission import admission
+from app.utils.logger import logger
+from app.websockets.connection import manager
+from app.websockets.read_state import read_state
+
+# Close code for drained sockets (RFC 6455: Service Restart)
+WS_SERVICE_RESTART = 1012
+
+
+class ShutdownDrain:
+    """Takes a worker's WebSockets down gradually instead of all at once.
+
+    On SIGTERM/SIGINT the drain runs before the server's own shutdown, which would otherwise
+    close every socket in the same instant:
+      1. stop accepting upgrades and defer presence
+      2. send pending presence deltas, wait for outbound queues to empty, flush read cursors
+      3. close sockets in waves spread over SHUTDOWN_DRAIN_SECONDS. Each close (code 1012)
+         carries a reason such as {"reconnect_in_ms":8123,"last_message_id":...}: a random
+         delay within SHUTDOWN_RECONNECT_WINDOW_SECONDS and the newest message the socket
+         received, so clients come back staggered and only fetch what they missed.
+    Then the server's original signal handler runs and shutdown continues as usual.
+    """
+
+    def __init__(self, drain_seconds: float, waves: int, reconnect_window_seconds: float, flush_timeout_seconds: float):
+        self.drain_seconds = drain_seconds
+        self.waves = max(waves, 1)
+        self.reconnect_window = reconnect_window_seconds
+        self.flush_timeout = flush_timeout_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._signalled = False
+
+    def install_signal_handlers(self):
+        """Chain in front of the server's SIGTERM/SIGINT handlers (call from the running loop)."""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(sig)
+            if not callable(previous) or previous is signal.default_int_handler:
+                continue  # No server handler to hand over to
+            signal.signal(sig, partial(self._on_signal, loop, previous))
+
+    def _on_signal(self, loop, previous, sig, frame):
+        if self._signalled:
+            previous(sig, frame)  # Second signal: stop draining and shut down now
+            return
+        self._signalled = True
+        logger.info(f"Received signal {sig}, draining WebSocket connections before shutdown")
+        loop.call_soon_threadsafe(self._drain_then, previous, sig)
+
+    def _drain_then(self, previous, sig):
+        async def run():
+            try:
+                await self.drain()
+            finally:
+                previous(sig, None)
+        asyncio.create_task(run())
+
+    async def drain(self):
+        """Run the drain once; later calls wait for the same run."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain())
+        await asyncio.shield(self._task)
+
+    async def _drain(self):
+        admission.draining = True
+        sockets = manager.connected_sockets()
+        logger.info(f"Draining {len(sockets)} WebSocket connections over {self.drain_seconds:.0f}s")
+
+        manager.flush_presence()
+        try:
+            await asyncio.wait_for(manager.wait_outbound_idle(), self.flush_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Outbound queues not empty after {self.flush_timeout:.0f}s; closing anyway")
+        try:
+            await read_state.flush_pending()
+        except Exception as e:
+            logger.error(f"Error flushing read cursors during drain: {str(e)}")
+
+        random.shuffle(sockets)
+        wave_size = max(math.ceil(len(sockets) / self.waves), 1)
+        waves = [sockets[i:i + wave_size] for i in range(0, len(sockets), wave_size)]
+        for index, wave in enumerate(waves):
+            await asyncio.gather(*(manager.close(websocket, WS_SERVICE_RESTART, self._close_reason(websocket)) for websocket in wave))
+            logger.info(f"Drain wave {index + 1}/{len(waves)}: closed {len(wave)} connections")
+            if index + 1 < len(waves):
+                await asyncio.sleep(self.drain_seconds / len(waves))
+
+    def _close_reason(self, websocket) -> str:
+        # Close reasons are capped at 123 bytes; this stays well under it
+        return json.dumps({
+            "reconnect_in_ms": int(random.uniform(0, self.reconnect_window) * 1000),
+            "last_message_id": manager.last_delivered.get(websocket)
+        }, separators=(",", ":"))
+
+
+# Initialize shutdown drain (singleton instance)
+shutdown_drain = ShutdownDrain(
+    drain_seconds=settings.SHUTDOWN_DRAIN_SECONDS,
+    waves=settings.SHUTDOWN_DRAIN_WAVES,
+    reconnect_window_seconds=settings.SHUTDOWN_RECONNECT_WINDOW_SECONDS,
+    flush_timeout_seconds=settings.SHUTDOWN_FLUSH_TIMEOUT_SECONDS
+)
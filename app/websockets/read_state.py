@@ -0,0 +1,136 @@
+# app/websockets/read_state.py
+from typing import Dict, Set, Tuple
+import asyncio
+import logging
+import threading
+import time
+from app.config import settings
+from app.crud.read_state import get_unread_counts, update_read_cursors
+from app.db.session import SessionLocal
+
+logger = logging.getLogger("chat_app.websocket")
+
+
+class ReadStateTracker:
+    """Buffers read-cursor updates and keeps per-user unread counts warm in memory.
+
+    Cursor updates arriving over WebSockets are coalesced per (user, room) and written in
+    one executemany by the periodic flusher. Unread counts are loaded with a single
+    aggregate query per user and then adjusted incrementally as messages arrive; entries
+    expire after UNREAD_CACHE_TTL_SECONDS so writes made by other processes are picked up.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # _pending[(user_id, room_id)] = highest message ID read, not yet written
+        self._pending: Dict[Tuple[int, int], int] = {}
+        # _counts[user_id][room_id] = unread count; _loaded_at[user_id] = monotonic load time
+        self._counts: Dict[int, Dict[int, int]] = {}
+        self._loaded_at: Dict[int, float] = {}
+        # _room_readers[room_id] = users with a cached count for that room
+        self._room_readers: Dict[int, Set[int]] = {}
+        # _latest[room_id] = newest message ID seen by this process
+        self._latest: Dict[int, int] = {}
+
+    def mark_read(self, user_id: int, room_id: int, message_id: int):
+        with self._lock:
+            key = (user_id, room_id)
+            if message_id <= self._pending.get(key, 0):
+                return
+            self._pending[key] = message_id
+
+            counts = self._counts.get(user_id)
+            if counts is not None and room_id in counts:
+                latest = self._latest.get(room_id)
+                if latest is not None and message_id >= latest:
+                    counts[room_id] = 0
+                else:
+                    # Partially read, or no message seen in this room since startup: the
+                    # remainder is only known to the database
+                    self._drop_user(user_id)
+
+    def message_created(self, room_id: int, message_id: int, sender_id: int):
+        with self._lock:
+            if message_id > self._latest.get(room_id, 0):
+                self._latest[room_id] = message_id
+            for user_id in self._room_readers.get(room_id, ()):
+                if user_id != sender_id:
+                    self._counts[user_id][room_id] += 1
+
+    def invalidate(self, user_id: int):
+        """Forget a user's cached counts, e.g. after joining or leaving a room."""
+        with self._lock:
+            self._drop_user(user_id)
+
+    def _drop_user(self, user_id: int):
+        counts = self._counts.pop(user_id, None)
+        self._loaded_at.pop(user_id, None)
+        for room_id in counts or ():
+            readers = self._room_readers.get(room_id)
+            if readers:
+                readers.discard(user_id)
+                if not readers:
+                    del self._room_readers[room_id]
+
+    def get_unread_counts(self, db, user_id: int) -> Dict[int, int]:
+        with self._lock:
+            loaded_at = self._loaded_at.get(user_id)
+            if loaded_at is not None and time.monotonic() - loaded_at < self.ttl_seconds:
+                return dict(self._counts[user_id])
+
+        # Pending cursors must reach the database before it can count from them
+        self.flush(db)
+        counts = get_unread_counts(db, user_id)
+
+        with self._lock:
+            self._drop_user(user_id)
+            self._counts[user_id] = dict(counts)
+            self._loaded_at[user_id] = time.monotonic()
+            for room_id in counts:
+                self._room_readers.setdefault(room_id, set()).add(user_id)
+        return counts
+
+    def flush(self, db) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            update_read_cursors(db, [(user_id, room_id, message_id) for (user_id, room_id), message_id in pending.items()])
+        except Exception:
+            db.rollback()
+            # Put the batch back so the next flush retries it
+            with self._lock:
+                for key, message_id in pending.items():
+                    if message_id > self._pending.get(key, 0):
+                        self._pending[key] = message_id
+            raise
+        return len(pending)
+
+    def _flush_with_session(self) -> int:
+        db = SessionLocal()
+        try:
+            return self.flush(db)
+        finally:
+            db.close()
+
+    async def flush_pending(self) -> int:
+        """Write buffered cursors now (off the event loop)."""
+        return await asyncio.to_thread(self._flush_with_session)
+
+    async def run_flusher(self, interval: float):
+        """Write buffered cursors every `interval` seconds until cancelled, then flush once more."""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(self._flush_with_session)
+                except Exception as e:
+                    logger.error(f"Error flushing read cursors: {str(e)}")
+        finally:
+            await asyncio.to_thread(self._flush_with_session)
+
+
+# Initialize read state tracker (singleton instance)
+read_state = ReadStateTracker(ttl_seconds=settings.UNREAD_CACHE_TTL_SECONDS)
@@ -0,0 +1,73 @@
+# app/websockets/tickets.py
+from typing import Dict, Optional, Tuple
+import time
+import jwt
+from app.config import settings
+from app.utils.logger import logger
+
+TICKET_TYPE = "room_ticket"
+
+
+class RoomTicketAuthority:
+    """Issues and verifies short-lived signed room tickets for WebSocket handshakes.
+
+    A ticket carries user ID, username and room ID and is minted by the REST API after it
+    has checked membership, so the handshake only verifies the signature and expiry. Tickets
+    are signed with a key derived from SECRET_KEY, so they are never accepted as access
+    tokens (or the other way round). Leaving a room, deleting it or deleting the account
+    records a revocation that refuses tickets issued before it; entries are pruned once every
+    ticket they could match has expired. The deny list is per process, so a revocation made
+    on another worker is only guaranteed to apply after ROOM_TICKET_TTL_SECONDS.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._key = f"{settings.SECRET_KEY}:{TICKET_TYPE}"
+        # _revoked[(user_id, room_id)] = revocation time; None matches every user / room
+        self._revoked: Dict[Tuple[Optional[int], Optional[int]], float] = {}
+
+    def issue(self, user_id: int, username: str, room_id: int) -> str:
+        now = time.time()
+        payload = {
+            "typ": TICKET_TYPE,
+            "sub": str(user_id),
+            "username": username,
+            "room_id": str(room_id),
+            "iat_ms": int(now * 1000),  # Millisecond precision so a revocation and a re-join in the same second are ordered
+            "exp": int(now + self.ttl_seconds),
+        }
+        return jwt.encode(payload, self._key, algorithm=settings.ALGORITHM)
+
+    def verify(self, ticket: str, room_id: int) -> Optional[Tuple[int, str]]:
+        """(user_id, username) for a valid, unrevoked ticket for this room; None otherwise."""
+        try:
+            payload = jwt.decode(ticket, self._key, algorithms=[settings.ALGORITHM])
+        except jwt.PyJWTError:
+            logger.warning(f"Room ticket rejected for room {room_id}: invalid or expired")
+            return None
+        if payload.get("typ") != TICKET_TYPE or payload.get("room_id") != str(room_id):
+            logger.warning(f"Room ticket rejected for room {room_id}: issued for another room")
+            return None
+        user_id = int(payload["sub"])
+        if self._is_revoked(user_id, room_id, payload["iat_ms"] / 1000):
+            logger.warning(f"Room ticket rejected for user {user_id} in room {room_id}: revoked")
+            return None
+        return user_id, payload["username"]
+
+    def revoke(self, user_id: int = None, room_id: int = None):
+        """Refuse tickets issued until now for the user in the room (either may be None for "all")."""
+        now = time.time()
+        cutoff = now - self.ttl_seconds
+        self._revoked = {key: revoked_at for key, revoked_at in self._revoked.items() if revoked_at > cutoff}
+        self._revoked[(user_id, room_id)] = now
+
+    def _is_revoked(self, user_id: int, room_id: int, issued_at: float) -> bool:
+        for key in ((user_id, room_id), (user_id, None), (None, room_id)):
+            revoked_at = self._revoked.get(key)
+            if revoked_at is not None and issued_at <= revoked_at:
+                return True
+        return False
+
+
+# Initialize room ticket authority (singleton instance)
+room_tickets = RoomTicketAuthority(ttl_seconds=settings.ROOM_TICKET_TTL_SECONDS)
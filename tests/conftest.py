@@ -0,0 +1,81 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# Settings are read when app.config is imported: point the app at a scratch SQLite database
+_db_dir = tempfile.mkdtemp(prefix="chat-tests-")
+os.environ["DB_URL"] = f"sqlite:///{_db_dir}/test.db"
+os.environ["MESSAGE_SHARDS"] = ""
+os.environ["SECRET_KEY"] = "test-secret-key-for-the-test-suite"
+# The pool app/scripts/check_ws_pool.py checks against: a handler that pins a connection
+# runs the suite out of connections quickly instead of going unnoticed
+os.environ["DB_POOL_SIZE"] = "10"
+os.environ["DB_MAX_OVERFLOW"] = "0"
+os.environ["DB_POOL_TIMEOUT_SECONDS"] = "2"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.dependencies.auth import create_access_token, get_password_hash
+from app.db.session import SessionLocal
+from app.main import app
+from app.models.message import Message
+from app.models.room import ChatRoom
+from app.models.user import User
+from app.crud.room_summary import create_room_summary, touch_room_summary
+from app.utils.ids import next_id
+from app.utils.room_directory import room_directory
+from app.utils.worker_slots import worker_slot_lease
+
+
+@pytest.fixture(scope="session", autouse=True)
+def worker_slot():
+    # The app's lifespan (and its background tasks) is not run, so lease the ID slot here
+    slot = worker_slot_lease.claim()
+    yield slot
+    worker_slot_lease.release()
+
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    def make(password: str = "password"):
+        user_id = next_id()
+        db.add(User(id=user_id, username=f"user_{user_id}", email=f"user_{user_id}@example.com", password=get_password_hash(password)))
+        db.commit()
+        return user_id
+    return make
+
+
+@pytest.fixture
+def make_room(db):
+    def make(creator_id: int, members=(), messages: int = 0):
+        room = ChatRoom(id=next_id(), name=f"room {next_id()}", creator_id=creator_id)
+        member_ids = [creator_id, *members]
+        room.users = db.query(User).filter(User.id.in_(member_ids)).all()
+        db.add(room)
+        create_room_summary(db, room.id, member_count=len(member_ids))
+        for i in range(messages):
+            message = Message(id=next_id(), text=f"message {i}", sender_id=member_ids[i % len(member_ids)], room_id=room.id)
+            db.add(message)
+            db.flush()
+            touch_room_summary(db, message)
+        db.commit()
+        room_directory.room_created(room.id, room.name, len(member_ids))
+        return room.id
+    return make
+
+
+def auth_headers(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
@@ -0,0 +1,76 @@
+# tests/test_deletion.py
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.crud.deletion import get_deletion_job, run_deletion_chunk
+from app.crud.room import delete_chat_room
+from app.crud.user import delete_user
+from app.models.message import Message
+from app.models.room import ChatRoom
+from app.models.user import User
+from tests.conftest import auth_headers
+
+
+def _connect(client, room_id: int, user_id: int):
+    return client.websocket_connect(f"/ws/chat/{room_id}?token={auth_headers(user_id)['Authorization'][7:]}")
+
+
+def _close_code(websocket) -> int:
+    with pytest.raises(WebSocketDisconnect) as closed:
+        while True:
+            websocket.receive_json()
+    return closed.value.code
+
+
+def _run_job(db, job_id: int):
+    for _ in range(100):
+        db.expire_all()
+        if run_deletion_chunk(db, get_deletion_job(db, job_id), batch_size=2):
+            return
+    raise AssertionError(f"Deletion job {job_id} did not finish")
+
+
+def test_deleting_a_room_closes_its_sockets(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(user_id)
+    with _connect(client, room_id, user_id) as websocket:
+        assert client.delete(f"/api/chat/rooms/{room_id}", headers=auth_headers(user_id)).status_code == 200
+        assert _close_code(websocket) == 1008
+
+
+def test_deleting_an_account_closes_its_sockets(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(user_id)
+    with _connect(client, room_id, user_id) as websocket:
+        assert client.delete("/api/delete", headers=auth_headers(user_id)).status_code == 200
+        assert _close_code(websocket) == 1008
+
+
+def test_messages_to_a_deleted_room_are_refused(client, db, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(user_id, messages=3)
+    with _connect(client, room_id, user_id) as websocket:
+        # Deleted through another worker: this one's sockets are not closed for it
+        job_id = delete_chat_room(db, room_id, requested_by=user_id)
+        websocket.send_json({"text": "after deletion"})
+        assert _close_code(websocket) == 1008
+
+    _run_job(db, job_id)
+    assert get_deletion_job(db, job_id).status == "done"
+    assert db.query(Message).filter(Message.room_id == room_id).count() == 0
+    assert db.query(ChatRoom).filter(ChatRoom.id == room_id).count() == 0
+
+
+def test_messages_from_a_deleted_user_are_refused(client, db, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(make_user(), members=[user_id], messages=4)
+    with _connect(client, room_id, user_id) as websocket:
+        job_id = delete_user(db, user_id)
+        websocket.send_json({"text": "after deletion"})
+        assert _close_code(websocket) == 1008
+
+    _run_job(db, job_id)
+    assert get_deletion_job(db, job_id).status == "done"
+    assert db.query(Message).filter(Message.sender_id == user_id).count() == 0
+    assert db.query(User).filter(User.id == user_id).count() == 0
+    assert db.query(Message).filter(Message.room_id == room_id).count() == 2
@@ -0,0 +1,197 @@
+# tests/test_query_budgets.py
+"""Every endpoint in QUERY_BUDGETS, called under assert_query_budget with its budget.
+
+Budgets are upper bounds: an endpoint that issues more statements fails here, and so does a
+budget entry without a test.
+"""
+import pytest
+
+from app.utils.query_budget import QUERY_BUDGETS, assert_query_budget, budget_report, reset_stats
+from tests.conftest import auth_headers
+
+TESTED = set()
+
+
+def budget(label: str):
+    TESTED.add(label)
+    return assert_query_budget(QUERY_BUDGETS[label], label=label)
+
+
+def test_register(client):
+    with budget("POST /api/register"):
+        response = client.post("/api/register", json={"username": "budget_register", "email": "budget_register@example.com", "password": "password"})
+    assert response.status_code == 200
+
+
+def test_login(client, db, make_user):
+    user_id = make_user("secret")
+    with budget("POST /api/login"):
+        response = client.post("/api/login", json={"username": f"user_{user_id}", "password": "secret"})
+    assert response.status_code == 200
+
+
+def test_delete_account(client, make_user):
+    user_id = make_user()
+    with budget("DELETE /api/delete"):
+        response = client.delete("/api/delete", headers=auth_headers(user_id))
+    assert response.status_code == 200
+    assert response.json()["data"]["job_id"]
+
+
+def test_list_rooms(client, make_user, make_room):
+    user_id = make_user()
+    make_room(user_id)
+    with budget("GET /api/chat/rooms"):
+        response = client.get("/api/chat/rooms", headers=auth_headers(user_id))
+    assert response.status_code == 200
+
+
+def test_create_room(client, make_user):
+    user_id = make_user()
+    with budget("POST /api/chat/rooms"):
+        response = client.post("/api/chat/rooms", json={"name": "budget room"}, headers=auth_headers(user_id))
+    assert response.status_code == 200
+
+
+def test_room_details(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(user_id, members=[make_user() for _ in range(5)])
+    with budget("GET /api/chat/rooms/{room_id}"):
+        response = client.get(f"/api/chat/rooms/{room_id}", headers=auth_headers(user_id))
+    assert response.status_code == 200
+
+
+def test_delete_room(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(user_id, messages=3)
+    with budget("DELETE /api/chat/rooms/{room_id}"):
+        response = client.delete(f"/api/chat/rooms/{room_id}", headers=auth_headers(user_id))
+    assert response.status_code == 200
+    assert response.json()["data"]["job_id"]
+
+
+def test_join_room(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(make_user(), members=[make_user() for _ in range(5)])
+    with budget("POST /api/chat/rooms/{room_id}/join"):
+        response = client.post(f"/api/chat/rooms/{room_id}/join", headers=auth_headers(user_id))
+    assert response.status_code == 200
+
+
+def test_leave_room(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(make_user(), members=[user_id] + [make_user() for _ in range(5)])
+    with budget("POST /api/chat/rooms/{room_id}/leave"):
+        response = client.post(f"/api/chat/rooms/{room_id}/leave", headers=auth_headers(user_id))
+    assert response.status_code == 200
+
+
+def test_room_ticket(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(user_id)
+    with budget("POST /api/chat/rooms/{room_id}/ticket"):
+        response = client.post(f"/api/chat/rooms/{room_id}/ticket", headers=auth_headers(user_id))
+    assert response.status_code == 200
+
+
+def test_room_users(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(user_id, members=[make_user() for _ in range(10)])
+    with budget("GET /api/chat/rooms/{room_id}/users"):
+        response = client.get(f"/api/chat/rooms/{room_id}/users", headers=auth_headers(user_id))
+    assert response.status_code == 200
+
+
+def test_room_messages(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(user_id, members=[make_user() for _ in range(3)], messages=20)
+    with budget("GET /api/chat/rooms/{room_id}/messages"):
+        response = client.get(f"/api/chat/rooms/{room_id}/messages", headers=auth_headers(user_id))
+    assert response.status_code == 200
+    assert len(response.json()) == 20
+
+
+def test_export_room(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(user_id, messages=20)
+    with budget("GET /api/chat/rooms/{room_id}/export"):
+        response = client.get(f"/api/chat/rooms/{room_id}/export", headers=auth_headers(user_id))
+    assert response.status_code == 200
+    assert len(response.content.splitlines()) == 20
+
+
+def test_post_messages(client, make_user, make_room):
+    user_id = make_user()
+    room_ids = [make_room(user_id) for _ in range(3)]
+    batch = [{"room_id": room_id, "text": f"hello {i}", "idempotency_key": f"key-{i}"} for i, room_id in enumerate(room_ids * 3)]
+    with budget("POST /api/chat/messages"):
+        response = client.post("/api/chat/messages", json={"messages": batch}, headers=auth_headers(user_id))
+    assert response.status_code == 200
+    assert response.json()["data"]["created"] == 9
+
+
+def test_inbox(client, make_user, make_room):
+    user_id = make_user()
+    for _ in range(5):
+        make_room(user_id, messages=2)
+    with budget("GET /api/chat/inbox"):
+        response = client.get("/api/chat/inbox", headers=auth_headers(user_id))
+    assert response.status_code == 200
+    assert len(response.json()["data"]["rooms"]) == 5
+
+
+def test_directory(client, make_user, make_room):
+    user_id = make_user()
+    make_room(user_id)
+    with budget("GET /api/chat/directory"):
+        response = client.get("/api/chat/directory?q=room", headers=auth_headers(user_id))
+    assert response.status_code == 200
+
+
+def test_unread(client, make_user, make_room):
+    user_id = make_user()
+    for _ in range(3):
+        make_room(user_id, members=[make_user()], messages=4)
+    with budget("GET /api/chat/unread"):
+        response = client.get("/api/chat/unread", headers=auth_headers(user_id))
+    assert response.status_code == 200
+
+
+def test_deletion_progress(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(user_id)
+    job_id = client.delete(f"/api/chat/rooms/{room_id}", headers=auth_headers(user_id)).json()["data"]["job_id"]
+    with budget("GET /api/chat/deletions/{job_id}"):
+        response = client.get(f"/api/chat/deletions/{job_id}", headers=auth_headers(user_id))
+    assert response.status_code == 200
+
+
+def test_websocket(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(user_id, members=[make_user()], messages=3)
+    token = auth_headers(user_id)["Authorization"][7:]
+    with budget("WS /ws/chat/{room_id} connect"):
+        websocket = client.websocket_connect(f"/ws/chat/{room_id}?token={token}").__enter__()
+    try:
+        with budget("WS /ws/chat/{room_id} message"):
+            websocket.send_json({"text": "hello"})
+            while websocket.receive_json().get("type") != "new_message":
+                pass
+        # Read frames get no reply: send one, then a message, and check the per-frame stats
+        # recorded by the handler once the message comes back
+        reset_stats()
+        websocket.send_json({"type": "read", "message_id": 1})
+        websocket.send_json({"text": "after read"})
+        while websocket.receive_json().get("type") != "new_message":
+            pass
+    finally:
+        websocket.__exit__(None, None, None)
+    label = "WS /ws/chat/{room_id} read"
+    TESTED.add(label)
+    (read,) = [row for row in budget_report() if row["endpoint"] == label]
+    assert read["max_queries"] <= QUERY_BUDGETS[label]
+
+
+def test_every_budget_is_tested():
+    # Runs last (pytest keeps file order)
+    assert set(QUERY_BUDGETS) - TESTED == set()
@@ -0,0 +1,75 @@
+# tests/test_websockets.py
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.utils.admission import WS_TRY_AGAIN_LATER
+from app.websockets import chat
+from app.websockets.connection import ConnectionManager, manager
+from tests.conftest import auth_headers
+
+
+class StalledWebSocket:
+    """A client that never reads: every send blocks."""
+
+    def __init__(self):
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await asyncio.Event().wait()
+
+    async def close(self, code, reason):
+        self.closed = (code, reason)
+
+
+def _token(user_id: int) -> str:
+    return auth_headers(user_id)["Authorization"][7:]
+
+
+def test_stalled_socket_is_closed_instead_of_queueing(monkeypatch):
+    monkeypatch.setattr(settings, "WS_OUTBOUND_QUEUE_LIMIT", 5)
+
+    async def run():
+        connections = ConnectionManager()
+        stalled = StalledWebSocket()
+        await connections.connect(stalled, 1, 1)
+        for i in range(20):
+            await connections.broadcast_message({"type": "new_message", "id": i, "text": "hi"}, 1)
+        await asyncio.sleep(0.01)
+        return connections, stalled
+
+    connections, stalled = asyncio.run(run())
+    assert stalled.closed[0] == WS_TRY_AGAIN_LATER
+    assert stalled not in connections.outbound
+    assert stalled not in connections.writers
+
+
+def test_malformed_frames_are_ignored(client, make_user, make_room):
+    user_id = make_user()
+    room_id = make_room(user_id)
+    with client.websocket_connect(f"/ws/chat/{room_id}?token={_token(user_id)}") as websocket:
+        websocket.send_text("not json")
+        websocket.send_text("[1, 2]")
+        websocket.send_json({"text": "still here"})
+        while (frame := websocket.receive_json()).get("type") != "new_message":
+            pass
+    assert frame["text"] == "still here"
+
+
+def test_failed_write_unregisters_the_socket(client, make_user, make_room, monkeypatch):
+    def fail(db, message):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(chat, "save_message", fail)
+    user_id = make_user()
+    room_id = make_room(user_id)
+    with pytest.raises(RuntimeError):
+        with client.websocket_connect(f"/ws/chat/{room_id}?token={_token(user_id)}") as websocket:
+            websocket.send_json({"text": "lost"})
+            websocket.receive_json()
+    assert not manager.active_connections.get(room_id)
+    assert user_id not in manager.user_connections
@@ -0,0 +1,79 @@
+# tests/test_ws_pool.py
+"""Idle WebSockets must not hold pooled connections (pytest port of app/scripts/check_ws_pool.py).
+
+Opens WS_POOL_TEST_SOCKETS sockets (200 by default; set it to 10000 for the full check) on the
+suite's 10-connection pool, in-process against the ASGI app.
+"""
+import asyncio
+import json
+import os
+
+import httpx
+
+from app.config import settings
+from app.db.session import SessionLocal, engine
+from app.main import app
+from app.models.message import Message
+from app.scripts.check_ws_pool import FakeWebSocket, _fixtures
+from tests.conftest import auth_headers
+
+SOCKETS = int(os.environ.get("WS_POOL_TEST_SOCKETS", "200"))
+ROOMS = max(SOCKETS // 100, 1)
+REQUESTS = 50
+SENDERS = 10
+
+
+def _stored(text: str) -> int:
+    with SessionLocal() as db:
+        return db.query(Message).filter(Message.text == text).count()
+
+
+async def _check():
+    pool = engine.pool
+    pairs = _fixtures(SOCKETS, ROOMS)
+    sockets, tasks = [], []
+    # A first wave just past the pool size: a handler that pins its connection fails here after
+    # a few pool timeouts, instead of one timeout per remaining socket
+    waves = [pairs[:settings.DB_POOL_SIZE + 5]] + [pairs[i:i + 1000] for i in range(settings.DB_POOL_SIZE + 5, len(pairs), 1000)]
+    try:
+        for wave in waves:
+            for room_id, user_id in wave:
+                websocket = FakeWebSocket(f"/ws/chat/{room_id}", f"token={auth_headers(user_id)['Authorization'][7:]}")
+                sockets.append(websocket)
+                tasks.append(websocket.run())
+            await asyncio.gather(*(websocket.accepted.wait() for websocket in sockets))
+            refused = [websocket.closed for websocket in sockets if websocket.closed is not None]
+            assert refused == []
+            assert pool.checkedout() == 0
+
+        # REST calls while every socket idles get a connection without waiting
+        room_id, user_id = pairs[0]
+        waits_before = pool.wait_stats.snapshot()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            for _ in range(REQUESTS):
+                response = await client.get(f"/api/chat/rooms/{room_id}/users", headers=auth_headers(user_id))
+                assert response.status_code == 200
+        waits = pool.wait_stats.snapshot()
+        assert waits["timeouts"] == waits_before["timeouts"] == 0
+        assert waits["waited"] == waits_before["waited"]
+        assert waits["checkouts"] > waits_before["checkouts"]
+
+        # Writes over the sockets return their connections too
+        for websocket in sockets[::len(sockets) // SENDERS][:SENDERS]:
+            websocket.send_text(json.dumps({"text": "pool test"}))
+        for _ in range(600):
+            if _stored("pool test") >= SENDERS:
+                break
+            await asyncio.sleep(0.05)
+        assert _stored("pool test") == SENDERS
+        assert pool.checkedout() == 0
+    finally:
+        for websocket in sockets:
+            websocket.disconnect()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def test_idle_websockets_hold_no_connections():
+    assert (settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW) == (10, 0)
+    assert SOCKETS > settings.DB_POOL_SIZE
+    asyncio.run(_check())